@@ -0,0 +1,249 @@
+"""
+Benchmarks for ProvaNota hot paths
+
+Runs against a scratch database (<DB_NAME>_bench by default) on the MongoDB
+configured in .env, seeding synthetic questions as needed. The scratch
+database is dropped at the end unless --keep is given.
+
+Usage:
+    python benchmarks.py sampling [--sizes 10000 100000 1000000] [--limit 90]
+    python benchmarks.py submit [--questions 180]
+    python benchmarks.py scoring [--attempts 20000] [--questions 180]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+
+import server
+
+SUBJECTS = server.VALID_SUBJECTS[:12]
+SOURCES = ["ENEM", "FUVEST", "UNICAMP", "UERJ", "UNESP"]
+
+
+def synthetic_question(rng: random.Random) -> dict:
+    subject = rng.choice(SUBJECTS)
+    topics = server.TOPICS_BY_SUBJECT.get(subject) or ["Geral"]
+    return {
+        'id': str(uuid.uuid4()),
+        'exam_id': None,
+        'statement': f"Questão sintética {rng.random()}",
+        'alternatives': [{'letter': letter, 'text': f"Alternativa {letter}"} for letter in "ABCDE"],
+        'correct_answer': rng.choice("ABCDE"),
+        'tags': [],
+        'difficulty': rng.choice(server.DIFFICULTIES),
+        'area': subject,
+        'subject': subject,
+        'topic': rng.choice(topics),
+        'education_level': rng.choice(server.EDUCATION_LEVELS),
+        'source_exam': rng.choice(SOURCES),
+        'year': rng.randint(2009, 2024),
+        'order': 0
+    }
+
+
+async def seed_questions(target: int, rng: random.Random, chunk: int = 5000):
+    """Top the questions collection up to `target` documents"""
+    existing = await server.db.questions.count_documents({})
+    remaining = target - existing
+    while remaining > 0:
+        batch = [synthetic_question(rng) for _ in range(min(chunk, remaining))]
+        await server.db.questions.insert_many(batch, ordered=False)
+        remaining -= len(batch)
+
+
+async def timed(fn, runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    }
+
+
+async def sample_through(index: server.QuestionFilterIndex, filters: dict, k: int):
+    """server.sample_question_ids end to end, with `index` as the worker's filter index"""
+    server.question_index = index
+    return await server.sample_question_ids(k, filters)
+
+
+async def bench_sampling(args):
+    rng = random.Random(42)
+    scenarios = [
+        ("sem filtros", {}),
+        ("1 matéria", {'subjects': ["Matemática"]}),
+        ("3 matérias + difícil", {'subjects': ["Física", "Química", "Biologia"], 'difficulty': "hard"}),
+        ("ENEM 2015-2020", {'sources': ["ENEM"], 'year_range': [2015, 2020]}),
+    ]
+    # A disabled index is never ready, so sample_question_ids takes the $match + $sample path
+    without_index = server.QuestionFilterIndex(enabled=False)
+    index = server.QuestionFilterIndex(enabled=True)
+    worker_index = server.question_index
+
+    try:
+        for size in sorted(args.sizes):
+            await seed_questions(size, rng)
+            await index.rebuild()
+            print(f"\n=== {size:,} questões (índice construído em {index.last_rebuild_seconds}s) ===")
+            print(f"{'cenário':<24} {'$sample p50':>12} {'$sample p99':>12} {'índice p50':>12} {'índice p99':>12}")
+
+            for name, filters in scenarios:
+                mongo = await timed(lambda: sample_through(without_index, filters, args.limit), args.runs)
+                # First draw builds the cached pool; report steady state like a warm worker
+                await sample_through(index, filters, args.limit)
+                indexed = await timed(lambda: sample_through(index, filters, args.limit), args.runs)
+                print(f"{name:<24} {mongo['p50']:>10.2f}ms {mongo['p99']:>10.2f}ms "
+                      f"{indexed['p50']:>10.3f}ms {indexed['p99']:>10.3f}ms")
+    finally:
+        server.question_index = worker_index
+
+
+def score_loop(entries: list, answers: dict) -> dict:
+    """Per-question Python scoring loop that submit_attempt used before AnswerKey"""
+    total_correct = 0
+    area_scores = {}
+    subject_scores = {}
+    for question_id, correct_answer, area, subject in entries:
+        area_scores.setdefault(area, {'correct': 0, 'total': 0})
+        subject_scores.setdefault(subject, {'correct': 0, 'total': 0})
+        area_scores[area]['total'] += 1
+        subject_scores[subject]['total'] += 1
+        if answers.get(question_id) == correct_answer:
+            total_correct += 1
+            area_scores[area]['correct'] += 1
+            subject_scores[subject]['correct'] += 1
+    for scores in (area_scores, subject_scores):
+        for name in scores:
+            scores[name]['percentage'] = round((scores[name]['correct'] / scores[name]['total']) * 100, 2)
+    return {
+        'total_correct': total_correct,
+        'total_questions': len(entries),
+        'percentage': round((total_correct / len(entries)) * 100, 2) if entries else 0,
+        'by_area': area_scores,
+        'by_subject': subject_scores
+    }
+
+
+async def score_full_documents(exam_id: str, answers: dict) -> dict:
+    """Scoring as submit_attempt did before answer keys: full documents + per-question loop"""
+    questions = await server.db.questions.find({'exam_id': exam_id}, {'_id': 0}).to_list(500)
+    return score_loop([server.answer_key_entry(q) for q in questions], answers)
+
+
+async def bench_submit(args):
+    rng = random.Random(7)
+    exam_id = str(uuid.uuid4())
+    long_text = "Texto-base de uma questão do ENEM com bastante contexto. " * 40
+    questions = []
+    for order in range(args.questions):
+        question = synthetic_question(rng)
+        question.update({
+            'exam_id': exam_id,
+            'order': order + 1,
+            'statement': long_text,
+            'alternatives': [{'letter': letter, 'text': long_text[:300]} for letter in "ABCDE"]
+        })
+        questions.append(question)
+    await server.db.questions.insert_many(questions)
+    # The answer-key cache revalidates against the exam's content_version
+    await server.db.exams.insert_one({'id': exam_id, 'content_version': 0})
+    answers = {q['id']: rng.choice("ABCDE") for q in questions}
+
+    print(f"\n=== Correção de uma prova com {args.questions} questões ===")
+    before = await timed(lambda: score_full_documents(exam_id, answers), args.runs)
+
+    async def cold_key():
+        key = await server.load_answer_key({'exam_id': exam_id}, 500)
+        return key.score(answers)
+
+    cold = await timed(cold_key, args.runs)
+
+    cache = server.AnswerKeyCache(max_entries=16)
+
+    async def cached_key():
+        return (await cache.get(exam_id)).score(answers)
+
+    await cache.get(exam_id)
+    warm = await timed(cached_key, args.runs)
+
+    for name, result in (("documentos completos", before), ("gabarito (projeção)", cold), ("gabarito em cache", warm)):
+        print(f"{name:<24} p50={result['p50']:>8.3f}ms  p99={result['p99']:>8.3f}ms")
+
+
+async def bench_scoring(args):
+    rng = random.Random(11)
+    entries = []
+    for _ in range(args.questions):
+        question = synthetic_question(rng)
+        entries.append(server.answer_key_entry(question))
+    attempts = [
+        {qid: rng.choice("ABCDE") for qid, *_ in entries if rng.random() < 0.9}
+        for _ in range(args.attempts)
+    ]
+    key = server.AnswerKey(entries)
+
+    # Both engines must agree before timing them
+    sample = attempts[:100]
+    assert key.score_many(sample) == [score_loop(entries, answers) for answers in sample]
+
+    print(f"\n=== Correção em lote: {args.attempts:,} tentativas x {args.questions} questões ===")
+    for name, fn in (
+        ("loop por questão", lambda: [score_loop(entries, answers) for answers in attempts]),
+        ("vetorizado (NumPy)", lambda: key.score_many(attempts)),
+    ):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24} {elapsed * 1000:>10.1f}ms  ({args.attempts / elapsed:,.0f} tentativas/s)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ProvaNota benchmarks")
+    parser.add_argument("--db", default=f"{os.environ.get('DB_NAME', 'provanota')}_bench",
+                        help="Scratch database to seed and benchmark against")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs per scenario")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sampling = subparsers.add_parser("sampling", help="$sample vs index-driven Floyd sampling")
+    sampling.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    sampling.add_argument("--limit", type=int, default=90, help="Questions drawn per simulation")
+    sampling.set_defaults(handler=bench_sampling)
+
+    submit = subparsers.add_parser("submit", help="submit_attempt scoring: full documents vs answer-key cache")
+    submit.add_argument("--questions", type=int, default=180, help="Questions in the benchmark exam")
+    submit.set_defaults(handler=bench_submit)
+
+    scoring = subparsers.add_parser("scoring", help="Batch scoring: per-question loop vs vectorized AnswerKey")
+    scoring.add_argument("--attempts", type=int, default=20_000)
+    scoring.add_argument("--questions", type=int, default=180)
+    scoring.set_defaults(handler=bench_scoring)
+
+    return parser
+
+
+async def run(args):
+    server.db = server.client[args.db]
+    try:
+        await args.handler(args)
+    finally:
+        if not args.keep:
+            await server.client.drop_database(args.db)
+        server.client.close()
+
+
+def main():
+    args = build_parser().parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Maintenance commands for ProvaNota
+
+Runs one-shot jobs against the database configured in .env, reusing the
+same code paths as the API.
+
+Usage:
+    python manage.py reconcile-question-counts
+    python manage.py regrade (--exam-id ID | --question-ids ID [ID ...]) [--dry-run] [--batch-size N]
+    python manage.py rebuild-user-stats [--user-id ID]
+    python manage.py refresh-question-stats [--batch-size N] [--max-batches N]
+"""
+
+import argparse
+import asyncio
+
+import server
+
+
+async def reconcile_question_counts(args):
+    result = await server.reconcile_question_counts()
+    print(f"Provas verificadas: {result['exams_checked']}")
+    print(f"Contadores corrigidos: {result['exams_updated']}")
+
+
+async def regrade(args):
+    result = await server.regrade_attempts(
+        exam_id=args.exam_id,
+        question_ids=args.question_ids,
+        dry_run=args.dry_run,
+        batch_size=args.batch_size
+    )
+    prefix = "[simulação] " if result['dry_run'] else ""
+    print(f"{prefix}Tentativas analisadas: {result['scanned']}")
+    print(f"{prefix}Notas alteradas: {result['changed']}")
+    print(f"{prefix}Notas gravadas: {result['written']}")
+    print(f"{prefix}Tempo: {result['elapsed_seconds']}s ({result['attempts_per_second']} tentativas/s)")
+
+
+async def rebuild_user_stats(args):
+    if args.user_id:
+        user_ids = [args.user_id]
+    else:
+        user_ids = [user['id'] async for user in server.db.users.find({}, {'_id': 0, 'id': 1})]
+    for user_id in user_ids:
+        await server.rebuild_user_stats(user_id)
+    print(f"Estatísticas reconstruídas: {len(user_ids)} usuário(s)")
+
+
+async def refresh_question_stats(args):
+    try:
+        result = await server.refresh_question_stats(batch_size=args.batch_size, max_batches=args.max_batches)
+    except server.HTTPException as e:
+        raise SystemExit(e.detail)
+    print(f"Tentativas processadas: {result['attempts']} em {result['batches']} lote(s)")
+    print(f"Respostas contabilizadas: {result['answers']}")
+    print(f"Questões atualizadas: {result['questions_updated']}")
+    print(f"Marca d'água: {result['watermark']}")
+    print(f"Tempo: {result['elapsed_seconds']}s ({result['attempts_per_second']} tentativas/s)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ProvaNota maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = subparsers.add_parser(
+        "reconcile-question-counts",
+        help="Recompute exams.question_count from the questions collection"
+    )
+    reconcile.set_defaults(handler=reconcile_question_counts)
+
+    regrade_parser = subparsers.add_parser(
+        "regrade",
+        help="Rescore completed attempts after an answer key change"
+    )
+    scope = regrade_parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--exam-id", help="Regrade every attempt of this exam")
+    scope.add_argument("--question-ids", nargs="+", help="Regrade attempts containing these questions")
+    regrade_parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    regrade_parser.add_argument("--batch-size", type=int, default=1000)
+    regrade_parser.set_defaults(handler=regrade)
+
+    stats = subparsers.add_parser(
+        "rebuild-user-stats",
+        help="Recompute dashboard stats and weekly subject trends from attempts"
+    )
+    stats.add_argument("--user-id", help="Only this user (default: every user)")
+    stats.set_defaults(handler=rebuild_user_stats)
+
+    item_stats = subparsers.add_parser(
+        "refresh-question-stats",
+        help="Fold attempts completed since the last run into question_stats"
+    )
+    item_stats.add_argument("--batch-size", type=int, default=server.QUESTION_STATS_BATCH_SIZE)
+    item_stats.add_argument("--max-batches", type=int, default=None, help="Stop after N batches (default: catch up)")
+    item_stats.set_defaults(handler=refresh_question_stats)
+
+    return parser
+
+
+async def run(args):
+    try:
+        await args.handler(args)
+    finally:
+        server.client.close()
+
+
+def main():
+    args = build_parser().parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
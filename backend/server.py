@@ -1,19 +1,44 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import List, Optional, Dict, Any, Literal, Iterable, Callable, Awaitable, get_args, get_origin
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
+import gzip
+import numpy as np
 import jwt
 import hashlib
+import base64
+import json
+import random
 import re
+import asyncio
+import time
+try:
+    import fcntl
+except ImportError:  # Windows: journal segments can't be locked
+    fcntl = None
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are offered as gzip only
+    brotli = None
+try:
+    import orjson
+except ImportError:  # Pinned in requirements.txt; a bare install still runs on the stdlib encoder
+    orjson = None
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -42,6 +67,73 @@ def _parse_origins(raw: str):
 
 CORS_ORIGINS = _parse_origins(os.environ.get('CORS_ORIGINS', 'http://localhost:3000'))
 
+# Password hashing pool: bcrypt is CPU-bound, so it runs off the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+# Max hash/verify calls waiting for a worker before auth requests are rejected (0 = unbounded)
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '200'))
+
+# Question import: rows per insert_many / duplicate-lookup round-trip
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+# NDJSON import: longest accepted line and how many per-line errors are echoed back
+IMPORT_MAX_LINE_BYTES = int(os.environ.get('IMPORT_MAX_LINE_BYTES', str(1024 * 1024)))
+IMPORT_MAX_REPORTED_ERRORS = 1000
+# Background import jobs: lease a worker holds on a job, and how often orphaned jobs are looked for
+IMPORT_JOB_LEASE_SECONDS = int(os.environ.get('IMPORT_JOB_LEASE_SECONDS', '60'))
+IMPORT_JOB_POLL_SECONDS = int(os.environ.get('IMPORT_JOB_POLL_SECONDS', '30'))
+
+# Question-bank metadata cache (/metadata/*): local entry lifetime in seconds. With
+# METADATA_CACHE_PERSIST the computed payload is shared via the metadata_cache
+# collection, so other workers reuse it and pick up invalidations within the TTL.
+METADATA_CACHE_TTL_SECONDS = float(os.environ.get('METADATA_CACHE_TTL_SECONDS', '300'))
+METADATA_CACHE_PERSIST = os.environ.get('METADATA_CACHE_PERSIST', '').lower() in ('1', 'true', 'yes')
+
+# In-process bitset index over question filter fields (/metadata/question-count,
+# simulation filtering). Rebuilt in full every QUESTION_INDEX_REFRESH_SECONDS so
+# writes made by other workers or scripts are picked up.
+QUESTION_INDEX_ENABLED = os.environ.get('QUESTION_INDEX_ENABLED', '').lower() in ('1', 'true', 'yes')
+QUESTION_INDEX_REFRESH_SECONDS = float(os.environ.get('QUESTION_INDEX_REFRESH_SECONDS', '300'))
+# Deletions made through the API are also logged to question_deletions; every
+# QUESTION_INDEX_DELETE_POLL_SECONDS each worker drops the ones made elsewhere
+# from its index instead of sampling them until the next rebuild (0 disables).
+QUESTION_INDEX_DELETE_POLL_SECONDS = float(os.environ.get('QUESTION_INDEX_DELETE_POLL_SECONDS', '5'))
+
+# Answer keys kept in process for scoring (number of exams)
+ANSWER_KEY_CACHE_SIZE = int(os.environ.get('ANSWER_KEY_CACHE_SIZE', '256'))
+
+# Serialized /exams/{id}/questions payloads kept in process (number of exams), and how
+# long a cached payload is served before its exam's content_version is re-read
+EXAM_PAYLOAD_CACHE_SIZE = int(os.environ.get('EXAM_PAYLOAD_CACHE_SIZE', '128'))
+EXAM_PAYLOAD_REVALIDATE_SECONDS = float(os.environ.get('EXAM_PAYLOAD_REVALIDATE_SECONDS', '5'))
+
+# Response compression: bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+# Fast JSON path for question lists and reviews: documents are shaped like their
+# response model and encoded directly with orjson, skipping per-item model
+# construction and response_model re-validation
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', '').lower() in ('1', 'true', 'yes')
+
+# Authenticated-user cache: bounds how stale a user doc can be on other workers (0 disables)
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000'))
+
+# Write-behind answer saving: answers are acknowledged once journaled to local disk
+# and written to MongoDB per attempt every ANSWER_FLUSH_INTERVAL_SECONDS (and on
+# submit). Buffers are per process, so attempts must stick to one worker
+# (single worker or sticky routing) for submit to see every answer.
+ANSWER_WRITE_BEHIND = os.environ.get('ANSWER_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+ANSWER_FLUSH_INTERVAL_SECONDS = float(os.environ.get('ANSWER_FLUSH_INTERVAL_SECONDS', '2'))
+ANSWER_JOURNAL_DIR = Path(os.environ.get('ANSWER_JOURNAL_DIR', str(ROOT_DIR / 'answer_journal')))
+# fsync each journaled answer: survives power loss, not just a process crash, at ~1 disk flush per click
+ANSWER_JOURNAL_FSYNC = os.environ.get('ANSWER_JOURNAL_FSYNC', '').lower() in ('1', 'true', 'yes')
+
+# Item statistics pipeline (question_stats): attempts per batch, how long after
+# submit an attempt becomes eligible (covers clock skew between workers), and
+# how many answers a question needs before a difficulty is suggested
+QUESTION_STATS_BATCH_SIZE = int(os.environ.get('QUESTION_STATS_BATCH_SIZE', '1000'))
+QUESTION_STATS_LAG_SECONDS = float(os.environ.get('QUESTION_STATS_LAG_SECONDS', '60'))
+QUESTION_STATS_MIN_SAMPLE = int(os.environ.get('QUESTION_STATS_MIN_SAMPLE', '30'))
+
 # Safety: require a JWT secret in production
 if not JWT_SECRET:
     raise RuntimeError("JWT_SECRET is required. Set it in your environment.")
@@ -51,6 +143,9 @@ if not JWT_SECRET:
 EDUCATION_LEVELS = ["escola", "vestibular", "faculdade"]
 DIFFICULTIES = ["easy", "medium", "hard"]
 AREAS_ENEM = ["Linguagens", "Humanas", "Natureza", "Matemática"]
+VALID_ANSWERS = ['A', 'B', 'C', 'D', 'E']
+# Most answers accepted in one /attempts/{id}/answers batch
+ANSWER_BATCH_MAX_ITEMS = 500
 
 VALID_SUBJECTS = [
     "Matemática", "Português", "Literatura", "Inglês", "Espanhol",
@@ -237,6 +332,9 @@ class SimulationGenerateRequest(BaseModel):
     year_range: Optional[List[int]] = None  # [min_year, max_year]
     limit: int = Field(default=10, ge=1, le=100)
     type: Literal["custom", "mixed"] = "custom"
+    # "mixed" only: relative weights per subject / difficulty (unlisted ones weigh 1)
+    subject_weights: Optional[Dict[str, float]] = None
+    difficulty_weights: Optional[Dict[str, float]] = None
 
 class SimulationResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -259,6 +357,13 @@ class AnswerSubmit(BaseModel):
     question_id: str
     selected_answer: str
 
+class AnswerBatchItem(AnswerSubmit):
+    seq: int = Field(..., ge=0)  # Client-side sequence number, increasing per attempt
+    client_ts: Optional[datetime] = None  # When the student answered, on the client clock
+
+class AnswerBatchSubmit(BaseModel):
+    answers: List[AnswerBatchItem] = Field(..., min_length=1, max_length=ANSWER_BATCH_MAX_ITEMS)
+
 class AttemptResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -322,6 +427,18 @@ class QuestionImport(BaseModel):
 class ImportQuestionsRequest(BaseModel):
     questions: List[QuestionImport]
 
+# Regrade Model
+class RegradeRequest(BaseModel):
+    exam_id: Optional[str] = None
+    question_ids: Optional[List[str]] = None
+    dry_run: bool = False
+    batch_size: int = Field(default=1000, ge=1, le=10000)
+
+# Question Stats Model
+class QuestionStatsRefreshRequest(BaseModel):
+    batch_size: int = Field(default=QUESTION_STATS_BATCH_SIZE, ge=1, le=10000)
+    max_batches: Optional[int] = Field(default=None, ge=1)
+
 # ===== AUTH HELPERS =====
 
 def hash_password(password: str) -> str:
@@ -330,6 +447,62 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so logins don't block the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    `max_workers` caps concurrent hashes; `max_queue` caps calls waiting for a
+    worker so a login storm fails fast with 503 instead of piling up.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int = 0):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pwhash')
+        self._in_flight = 0
+        self._peak_queue_depth = 0
+        self._rejected = 0
+        self._completed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker (excludes the ones being hashed)"""
+        return max(0, self._in_flight - self.max_workers)
+
+    async def _run(self, fn, *args):
+        if self.max_queue and self.queue_depth >= self.max_queue:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail='Server busy, please try again')
+        self._in_flight += 1
+        self._peak_queue_depth = max(self._peak_queue_depth, self.queue_depth)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'queue_depth': self.queue_depth,
+            'peak_queue_depth': self._peak_queue_depth,
+            'completed': self._completed,
+            'rejected': self._rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
 def create_jwt_token(user_id: str) -> str:
     expiration = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
     payload = {
@@ -338,18 +511,105 @@ def create_jwt_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+class UserCache:
+    """TTL + LRU cache of authenticated users keyed by bearer token.
+
+    A hit skips both jwt.decode and the users lookup. Entries never outlive the
+    token's own `exp`, and `invalidate(user_id)` drops every token of a user
+    whose document changed. Invalidation is per process, so on multi-worker
+    deployments other workers catch up after at most `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expires_at, user)
+        self._tokens_by_user: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._evict(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return dict(user)
+
+    def put(self, token: str, user: dict, token_exp: Optional[float] = None):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        if token_exp is not None:
+            # Never serve a token from cache past its own expiry
+            expires_at = min(expires_at, time.monotonic() + (token_exp - time.time()))
+        self._entries[token] = (expires_at, dict(user))
+        self._entries.move_to_end(token)
+        self._tokens_by_user.setdefault(user['id'], set()).add(token)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def invalidate(self, user_id: str):
+        tokens = self._tokens_by_user.pop(user_id, set())
+        for token in tokens:
+            self._entries.pop(token, None)
+        self.invalidations += 1
+
+    def _evict(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[1]['id']
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            'invalidations': self.invalidations
+        }
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    if user_cache.enabled:
+        cached = user_cache.get(token)
+        if cached is not None:
+            return cached
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get('user_id')
         if not user_id:
             raise HTTPException(status_code=401, detail='Invalid token')
         
-        user = await db.users.find_one({'id': user_id}, {'_id': 0})
+        user = await db.users.find_one({'id': user_id}, {'_id': 0, 'password_hash': 0})
         if not user:
             raise HTTPException(status_code=401, detail='User not found')
         
+        user_cache.put(token, user, payload.get('exp'))
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail='Token expired')
@@ -371,7 +631,7 @@ async def register(user_data: UserRegister):
     user_doc = {
         'id': user_id,
         'email': user_data.email,
-        'password_hash': hash_password(user_data.password),
+        'password_hash': await password_hasher.hash(user_data.password),
         'name': user_data.name,
         'role': role,
         'subscription_status': 'free',
@@ -390,7 +650,7 @@ async def login(credentials: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail='Invalid credentials')
     
-    if not verify_password(credentials.password, user['password_hash']):
+    if not await password_hasher.verify(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail='Invalid credentials')
     
     token = create_jwt_token(user['id'])
@@ -400,6 +660,968 @@ async def login(credentials: UserLogin):
 async def get_me(current_user: dict = Depends(get_current_user)):
     return UserResponse(**current_user)
 
+# ===== RESPONSE COMPRESSION =====
+#
+# Cached payloads (published exam questions) are compressed once per content
+# version at maximum effort and kept next to the raw bytes; per-request
+# payloads (reviews) are compressed at a cheaper level in a worker thread so
+# the event loop isn't blocked on large bodies.
+
+# Server preference when the client accepts several equally
+COMPRESSION_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+def compress_body(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if cached else 5)
+    # mtime=0 keeps the bytes (and so the ETag) stable across rebuilds
+    return gzip.compress(body, compresslevel=9 if cached else 6, mtime=0)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported content-coding for an Accept-Encoding header (None = identity)"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in COMPRESSION_ENCODINGS:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+async def compressed_json_response(request: Request, body: bytes, headers: Optional[dict] = None) -> Response:
+    """JSON response compressed per request when the client accepts it and the body is large enough"""
+    headers = {**(headers or {}), 'Vary': 'Accept-Encoding'}
+    encoding = negotiate_encoding(request.headers.get('accept-encoding')) if len(body) >= COMPRESSION_MIN_BYTES else None
+    if encoding:
+        body = await asyncio.to_thread(compress_body, body, encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type='application/json', headers=headers)
+
+# ===== FAST JSON RESPONSES =====
+#
+# With FAST_JSON_RESPONSES, list routes hand MongoDB documents straight to the
+# encoder instead of building a Pydantic model per item and letting FastAPI
+# validate and serialize them again through response_model. Documents come
+# from an inclusion projection of the model's fields and are reshaped to its
+# field order and defaults, so the bytes match what the model would produce
+# (backend_test.py checks the output against the OpenAPI schemas).
+
+def encode_json(content: Any) -> bytes:
+    """Compact UTF-8 JSON, byte-compatible with FastAPI's JSONResponse"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class ModelShape:
+    """Field layout of a response model, for shaping raw documents without building the model.
+
+    Values are not validated or coerced: only use it for models made of plain
+    JSON types, over documents the API validated on the way in.
+    """
+
+    def __init__(self, model: type):
+        self.fields = []
+        for name, field in model.model_fields.items():
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            self.fields.append((name, default, self._nested(field.annotation)))
+        self.projection = {'_id': 0, **{name: 1 for name, _, _ in self.fields}}
+
+    @staticmethod
+    def _nested(annotation) -> Optional[tuple]:
+        """(ModelShape, is_list) for a nested model field, None for plain values"""
+        if get_origin(annotation) is list:
+            item = get_args(annotation)[0]
+            if isinstance(item, type) and issubclass(item, BaseModel):
+                return ModelShape(item), True
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return ModelShape(annotation), False
+        return None
+
+    def shape(self, doc: dict) -> dict:
+        shaped = {}
+        for name, default, nested in self.fields:
+            value = doc.get(name, default)
+            if nested is not None and value is not None:
+                shape, many = nested
+                value = [shape.shape(item) for item in value] if many else shape.shape(value)
+            shaped[name] = value
+        return shaped
+
+QUESTION_SHAPE = ModelShape(QuestionResponse)
+STUDENT_QUESTION_SHAPE = ModelShape(QuestionResponseStudent)
+
+def json_bytes_response(body: bytes, headers: Optional[dict] = None) -> Response:
+    return Response(content=body, media_type='application/json', headers=headers)
+
+# ===== KEYSET PAGINATION =====
+#
+# Listings page on (sort field, id) instead of skip: the cursor carries the
+# last row's sort value and id, so every page is one index seek no matter
+# how deep it is, and rows with equal sort values (imported questions all
+# share order 0) are neither repeated nor dropped. The next page's cursor is
+# returned in the X-Next-Cursor header, absent on the last page, rather than
+# in a {items, next_cursor} envelope: bodies stay the plain lists existing
+# clients parse, and every client that needs the full listing follows the
+# header (frontend getAllPages).
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+def encode_cursor(sort_field: str, value: Any, last_id: str) -> str:
+    raw = json.dumps([sort_field, value, last_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, sort_field: str) -> tuple:
+    """(sort value, id) from a cursor issued by the same listing; 400 on anything else"""
+    try:
+        field, value, last_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if field != sort_field or not isinstance(last_id, str):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return value, last_id
+
+def keyset_filter(sort_field: str, direction: int, value: Any, last_id: str) -> dict:
+    """Rows strictly after (value, last_id) in (sort_field, id) order"""
+    op = '$gt' if direction == 1 else '$lt'
+    tie = {sort_field: value, 'id': {op: last_id}}
+    if value is None:
+        # Missing/null sort values come first ascending and last descending
+        return {'$or': [tie, {sort_field: {'$ne': None}}]} if direction == 1 else tie
+    return {'$or': [{sort_field: {op: value}}, tie]}
+
+def page_size(limit: int, maximum: int) -> int:
+    return max(1, min(limit, maximum))
+
+async def keyset_page(
+    collection,
+    query: dict,
+    projection: dict,
+    sort_field: str,
+    direction: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> tuple:
+    """(documents, next cursor or None) for one page of `query` in (sort_field, id) order.
+
+    `skip` is only honoured without a cursor, for clients still paging by offset.
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_field)
+        query = {**query, **keyset_filter(sort_field, direction, value, last_id)}
+    find = collection.find(query, projection).sort([(sort_field, direction), ('id', direction)])
+    if skip and not cursor:
+        find = find.skip(skip)
+    # One extra row tells whether another page exists without a count
+    docs = await find.limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(sort_field, docs[-1].get(sort_field), docs[-1]['id'])
+
+def next_cursor_headers(next_cursor: Optional[str]) -> dict:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+# ===== QUESTION BANK CACHES =====
+
+class MetadataCache:
+    """Caches payloads derived from the whole question bank (filter options, facets).
+
+    Entries live in process for `ttl` seconds and are dropped by `invalidate()`
+    whenever questions change. With `persist`, payloads are also stored in the
+    metadata_cache collection so a cold worker reuses another worker's result
+    instead of recomputing it.
+    """
+
+    def __init__(self, ttl: float, persist: bool, max_entries: int = 1024):
+        self.ttl = ttl
+        self.persist = persist
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}  # key -> (expires_at, value)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        
+        generation = self._generation
+        value = None
+        if self.persist:
+            stored = await db.metadata_cache.find_one({'key': key}, {'_id': 0, 'value': 1})
+            if stored:
+                value = stored['value']
+        if value is None:
+            value = await compute()
+            if self.persist and generation == self._generation:
+                await db.metadata_cache.update_one(
+                    {'key': key},
+                    {'$set': {'value': value, 'computed_at': datetime.now(timezone.utc).isoformat()}},
+                    upsert=True
+                )
+        # Don't cache a value computed from data that changed while we were computing
+        if generation == self._generation:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                # Insertion order == expiry order, so this drops the oldest entry
+                del self._entries[next(iter(self._entries))]
+        return value
+
+    async def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+        self.invalidations += 1
+        if self.persist:
+            await db.metadata_cache.delete_many({})
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'ttl_seconds': self.ttl,
+            'persist': self.persist,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations
+        }
+
+metadata_cache = MetadataCache(METADATA_CACHE_TTL_SECONDS, METADATA_CACHE_PERSIST)
+
+QUESTION_INDEX_FIELDS = ('subject', 'topic', 'education_level', 'difficulty', 'source_exam', 'year')
+
+def _mask_from_ordinals(ordinals) -> int:
+    """Build a bitset (as a Python int) with the given bit positions set"""
+    if not ordinals:
+        return 0
+    buf = bytearray(max(ordinals) // 8 + 1)
+    for o in ordinals:
+        buf[o >> 3] |= 1 << (o & 7)
+    return int.from_bytes(buf, 'little')
+
+# Set-bit positions of every byte value, for expanding bitsets into ordinal lists
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+def _bitset_positions(mask: int) -> array:
+    """Sorted positions of the set bits of `mask`"""
+    positions = array('I')
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index << 3
+            positions.extend(base + bit for bit in _BYTE_BITS[byte])
+    return positions
+
+def floyd_sample(n: int, k: int, rng: random.Random = random) -> List[int]:
+    """k distinct integers from range(n) in O(k) time and memory (Floyd's algorithm)"""
+    k = min(k, n)
+    chosen = set()
+    picks = []
+    for j in range(n - k, n):
+        t = rng.randrange(j + 1)
+        pick = j if t in chosen else t
+        chosen.add(pick)
+        picks.append(pick)
+    # Floyd's picks are uniform as a set but not as a sequence
+    rng.shuffle(picks)
+    return picks
+
+class _BitmapState:
+    """One generation of the question filter index.
+
+    Every question gets a stable ordinal; each (field, value) pair maps to a
+    bitset of ordinals stored as a Python int, so filters are ANDs/ORs of ints
+    and counts are `bit_count()`. Deleted ordinals are not reused until the
+    next full rebuild compacts them away.
+    """
+
+    def __init__(self):
+        self.ids: List[Optional[str]] = []
+        self.ordinal_by_id: Dict[str, int] = {}
+        self.row_values: List[Optional[tuple]] = []
+        self.bitmaps: Dict[str, Dict[Any, int]] = {field: {} for field in QUESTION_INDEX_FIELDS}
+        self.live = 0
+
+    @classmethod
+    async def load(cls, cursor) -> "_BitmapState":
+        state = cls()
+        ordinals: Dict[str, Dict[Any, array]] = {field: {} for field in QUESTION_INDEX_FIELDS}
+        async for doc in cursor:
+            o = len(state.ids)
+            state.ids.append(doc['id'])
+            state.ordinal_by_id[doc['id']] = o
+            values = tuple(doc.get(field) for field in QUESTION_INDEX_FIELDS)
+            state.row_values.append(values)
+            for field, value in zip(QUESTION_INDEX_FIELDS, values):
+                ordinals[field].setdefault(value, array('I')).append(o)
+        for field, by_value in ordinals.items():
+            state.bitmaps[field] = {value: _mask_from_ordinals(ords) for value, ords in by_value.items()}
+        state.live = _mask_from_ordinals(range(len(state.ids)))
+        return state
+
+    def apply(self, upserted: Iterable[dict], deleted_ids: Iterable[str]):
+        cleared = {field: {} for field in QUESTION_INDEX_FIELDS}
+        added = {field: {} for field in QUESTION_INDEX_FIELDS}
+        dead, born = [], []
+        
+        for qid in deleted_ids:
+            o = self.ordinal_by_id.pop(qid, None)
+            if o is None:
+                continue
+            for field, value in zip(QUESTION_INDEX_FIELDS, self.row_values[o]):
+                cleared[field].setdefault(value, []).append(o)
+            self.ids[o] = None
+            self.row_values[o] = None
+            dead.append(o)
+        
+        for doc in upserted:
+            o = self.ordinal_by_id.get(doc['id'])
+            if o is None:
+                o = len(self.ids)
+                self.ids.append(doc['id'])
+                self.row_values.append(None)
+                self.ordinal_by_id[doc['id']] = o
+                born.append(o)
+            elif self.row_values[o] is not None:
+                for field, value in zip(QUESTION_INDEX_FIELDS, self.row_values[o]):
+                    cleared[field].setdefault(value, []).append(o)
+            values = tuple(doc.get(field) for field in QUESTION_INDEX_FIELDS)
+            self.row_values[o] = values
+            for field, value in zip(QUESTION_INDEX_FIELDS, values):
+                added[field].setdefault(value, []).append(o)
+        
+        # Clear before set: an updated row may clear and re-set the same value
+        for field in QUESTION_INDEX_FIELDS:
+            bitmaps = self.bitmaps[field]
+            for value, ords in cleared[field].items():
+                remaining = bitmaps.get(value, 0) & ~_mask_from_ordinals(ords)
+                if remaining:
+                    bitmaps[value] = remaining
+                else:
+                    bitmaps.pop(value, None)
+            for value, ords in added[field].items():
+                bitmaps[value] = bitmaps.get(value, 0) | _mask_from_ordinals(ords)
+        self.live = (self.live & ~_mask_from_ordinals(dead)) | _mask_from_ordinals(born)
+
+class QuestionFilterIndex:
+    """Optional in-process bitset index answering question filter queries.
+
+    Mirrors the subject/topic/education_level/difficulty/source_exam/year
+    fields of every question. Writes made through the API are applied
+    incrementally via notify_questions_changed in the process that made them;
+    deletions made by other workers arrive through the question_deletions log
+    (`apply_remote_deletions`), and a periodic full rebuild picks up
+    everything else. Until the first build finishes (`ready`), callers fall
+    back to MongoDB.
+    """
+
+    POOL_CACHE_SIZE = 256
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.ready = False
+        self._state = _BitmapState()
+        # criteria signature -> sorted ordinals matching it (sampling pools)
+        self._pools: "OrderedDict[str, array]" = OrderedDict()
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self._rebuilding = False
+        self._pending: List[tuple] = []
+        self.rebuilds = 0
+        self.last_rebuild_seconds: Optional[float] = None
+        self.queries = 0
+        # Deletions logged from this point on are not reflected in the index yet
+        self._deletions_since: Optional[datetime] = None
+        self.remote_deletions = 0
+
+    async def rebuild(self):
+        started = time.monotonic()
+        scan_started_at = datetime.now(timezone.utc)
+        self._rebuilding = True
+        self._pending = []
+        try:
+            projection = {'_id': 0, 'id': 1, **{field: 1 for field in QUESTION_INDEX_FIELDS}}
+            state = await _BitmapState.load(db.questions.find({}, projection))
+            # Replay writes that raced with the scan (apply is idempotent)
+            for upserted, deleted_ids in self._pending:
+                state.apply(upserted, deleted_ids)
+            self._state = state
+            self._pools.clear()
+            self._deletions_since = scan_started_at
+            self.ready = True
+        finally:
+            self._rebuilding = False
+            self._pending = []
+        self.rebuilds += 1
+        self.last_rebuild_seconds = round(time.monotonic() - started, 3)
+
+    def apply(self, upserted: Iterable[dict] = (), deleted_ids: Iterable[str] = ()):
+        if not self.enabled:
+            return
+        upserted, deleted_ids = list(upserted), list(deleted_ids)
+        self._state.apply(upserted, deleted_ids)
+        self._pools.clear()
+        if self._rebuilding:
+            self._pending.append((upserted, deleted_ids))
+
+    async def apply_remote_deletions(self):
+        """Drop questions that other workers logged as deleted since the last poll or rebuild"""
+        since = self._deletions_since
+        if since is None:
+            return
+        polled_at = datetime.now(timezone.utc)
+        # Windows overlap to absorb clock skew between workers; re-applying a deletion is a no-op
+        deleted_ids = [
+            entry['question_id'] async for entry in db.question_deletions.find(
+                {'deleted_at': {'$gte': since - QUESTION_DELETION_SKEW}}, {'_id': 0, 'question_id': 1}
+            )
+        ]
+        stale = [qid for qid in deleted_ids if qid in self._state.ordinal_by_id]
+        if stale:
+            self.apply(deleted_ids=stale)
+            self.remote_deletions += len(stale)
+        self._deletions_since = polled_at
+
+    def match(
+        self,
+        subjects: Optional[List[str]] = None,
+        topics: Optional[List[str]] = None,
+        education_level: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+        year_range: Optional[List[int]] = None
+    ) -> int:
+        """Bitset of live question ordinals matching the filters (same semantics as build_question_filters)"""
+        self.queries += 1
+        state = self._state
+        
+        def any_of(field, values):
+            mask = 0
+            for value in values:
+                mask |= state.bitmaps[field].get(value, 0)
+            return mask
+        
+        result = state.live
+        if subjects:
+            result &= any_of('subject', [normalize_subject(s) for s in subjects])
+        if topics:
+            result &= any_of('topic', topics)
+        if education_level:
+            result &= state.bitmaps['education_level'].get(education_level, 0)
+        if difficulty:
+            result &= state.bitmaps['difficulty'].get(difficulty, 0)
+        if sources:
+            result &= any_of('source_exam', sources)
+        if year_range and len(year_range) == 2:
+            years = [
+                y for y in state.bitmaps['year']
+                if isinstance(y, (int, float)) and year_range[0] <= y <= year_range[1]
+            ]
+            result &= any_of('year', years)
+        return result
+
+    def count(self, **filters) -> int:
+        return self.match(**filters).bit_count()
+
+    def values(self, field: str) -> List[Any]:
+        """Distinct values currently indexed for a field"""
+        return list(self._state.bitmaps[field].keys())
+
+    def _stratum_mask(self, subject: Any, difficulty: Any) -> int:
+        bitmaps = self._state.bitmaps
+        return bitmaps['subject'].get(subject, 0) & bitmaps['difficulty'].get(difficulty, 0)
+
+    def strata(self, **filters) -> Dict[tuple, int]:
+        """Questions matching the filters per exact (subject, difficulty) pair, None included like a $group"""
+        matched = self.match(**filters)
+        bitmaps = self._state.bitmaps
+        counts = {}
+        for subject, subject_mask in bitmaps['subject'].items():
+            in_subject = matched & subject_mask
+            if not in_subject:
+                continue
+            for difficulty, difficulty_mask in bitmaps['difficulty'].items():
+                count = (in_subject & difficulty_mask).bit_count()
+                if count:
+                    counts[(subject, difficulty)] = count
+        return counts
+
+    def pool(self, stratum: Optional[tuple] = None, **filters) -> array:
+        """Ordinals matching the filters (and the exact (subject, difficulty) `stratum`, if given),
+        cached per criteria signature until the index changes"""
+        key = json.dumps([stratum, filters], sort_keys=True, ensure_ascii=False)
+        positions = self._pools.get(key)
+        if positions is not None:
+            self._pools.move_to_end(key)
+            self.pool_hits += 1
+            return positions
+        self.pool_misses += 1
+        matched = self.match(**filters)
+        if stratum is not None:
+            matched &= self._stratum_mask(*stratum)
+        positions = _bitset_positions(matched)
+        self._pools[key] = positions
+        while len(self._pools) > self.POOL_CACHE_SIZE:
+            self._pools.popitem(last=False)
+        return positions
+
+    def sample(self, k: int, rng: random.Random = random, stratum: Optional[tuple] = None, **filters) -> List[str]:
+        """Up to k distinct random question ids matching the filters (and `stratum`, see `pool`)"""
+        positions = self.pool(stratum, **filters)
+        ids = self._state.ids
+        return [ids[positions[i]] for i in floyd_sample(len(positions), k, rng)]
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            'enabled': self.enabled,
+            'ready': self.ready,
+            'questions': state.live.bit_count(),
+            'ordinals': len(state.ids),
+            'distinct_values': {field: len(state.bitmaps[field]) for field in QUESTION_INDEX_FIELDS},
+            'rebuilds': self.rebuilds,
+            'last_rebuild_seconds': self.last_rebuild_seconds,
+            'remote_deletions': self.remote_deletions,
+            'queries': self.queries,
+            'cached_pools': len(self._pools),
+            'pool_hits': self.pool_hits,
+            'pool_misses': self.pool_misses
+        }
+
+QUESTION_DELETION_SKEW = timedelta(seconds=30)
+
+question_index = QuestionFilterIndex(QUESTION_INDEX_ENABLED)
+
+async def question_index_refresher():
+    while True:
+        try:
+            await question_index.rebuild()
+        except Exception as e:
+            logger.exception(f"Question index rebuild failed: {e}")
+        next_rebuild = time.monotonic() + QUESTION_INDEX_REFRESH_SECONDS
+        while (remaining := next_rebuild - time.monotonic()) > 0:
+            if QUESTION_INDEX_DELETE_POLL_SECONDS <= 0:
+                await asyncio.sleep(remaining)
+                break
+            await asyncio.sleep(min(QUESTION_INDEX_DELETE_POLL_SECONDS, remaining))
+            try:
+                await question_index.apply_remote_deletions()
+            except Exception as e:
+                logger.exception(f"Question index deletion poll failed: {e}")
+
+ANSWER_KEY_PROJECTION = {'_id': 0, 'id': 1, 'correct_answer': 1, 'area': 1, 'subject': 1}
+
+def answer_key_entry(question: dict) -> tuple:
+    """(question id, correct letter, area, subject) with the scoring fallbacks applied"""
+    area = question.get('area') or question.get('subject') or 'Geral'
+    subject = question.get('subject') or area
+    return (question['id'], question.get('correct_answer'), area, subject)
+
+ANSWER_LETTER_CODES = {letter: code for code, letter in enumerate("ABCDE")}
+
+@lru_cache(maxsize=65536)
+def _round_percentage(correct: int, total: int) -> float:
+    return round((correct / total) * 100, 2) if total > 0 else 0
+
+class AnswerKey:
+    """Answer key encoded for vectorized scoring.
+
+    Correct letters become small ints (A=0..E=4) and areas/subjects become
+    category codes, in first-appearance order so score breakdowns keep the
+    question order. `score_many` grades a whole batch of attempts with one
+    comparison matrix and two matrix products instead of a Python loop per
+    question per attempt.
+    """
+
+    UNANSWERED = -1
+    UNGRADABLE = -2  # correct answer outside A-E: nothing can match it
+
+    def __init__(self, entries: List[tuple]):
+        self.question_ids = [entry[0] for entry in entries]
+        self.position = {qid: i for i, qid in enumerate(self.question_ids)}
+        self.correct = np.array(
+            [ANSWER_LETTER_CODES.get(entry[1], self.UNGRADABLE) for entry in entries],
+            dtype=np.int8
+        )
+        self.areas, area_codes = self._categorize(entry[2] for entry in entries)
+        self.subjects, subject_codes = self._categorize(entry[3] for entry in entries)
+        # question x category indicator matrices; float32 so the products run on
+        # BLAS (counts stay far below float32's exact-integer range)
+        self._area_matrix = np.zeros((len(entries), len(self.areas)), dtype=np.float32)
+        self._area_matrix[np.arange(len(entries)), area_codes] = 1
+        self._subject_matrix = np.zeros((len(entries), len(self.subjects)), dtype=np.float32)
+        self._subject_matrix[np.arange(len(entries)), subject_codes] = 1
+        self.area_totals = self._area_matrix.sum(axis=0).astype(np.int64).tolist()
+        self.subject_totals = self._subject_matrix.sum(axis=0).astype(np.int64).tolist()
+
+    @staticmethod
+    def _categorize(values: Iterable[str]) -> tuple:
+        names: List[str] = []
+        codes_by_name: Dict[str, int] = {}
+        codes = []
+        for value in values:
+            if value not in codes_by_name:
+                codes_by_name[value] = len(names)
+                names.append(value)
+            codes.append(codes_by_name[value])
+        return names, np.array(codes, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def encode_answers(self, answers_list: List[Dict[str, str]]) -> np.ndarray:
+        """attempts x questions matrix of selected letter codes (-1 = unanswered)"""
+        selected = np.full((len(answers_list), len(self)), self.UNANSWERED, dtype=np.int8)
+        position_of = self.position.get
+        cols: list = []
+        letters: List[str] = []
+        lengths = []
+        for answers in answers_list:
+            answers = answers or {}
+            cols.extend(map(position_of, answers.keys()))
+            letters.extend(answers.values())
+            lengths.append(len(answers))
+        if not cols:
+            return selected
+        
+        rows = np.repeat(np.arange(len(answers_list)), lengths)
+        if None in cols:
+            # Answers to questions outside the key don't count
+            cols = np.array([-1 if col is None else col for col in cols], dtype=np.int64)
+        else:
+            cols = np.array(cols, dtype=np.int64)
+        codes = self._encode_letters(letters)
+        keep = (cols >= 0) & (codes != self.UNANSWERED)
+        selected[rows[keep], cols[keep]] = codes[keep]
+        return selected
+
+    @classmethod
+    def _encode_letters(cls, letters: List[str]) -> np.ndarray:
+        # Only when every item is one character do the joined bytes line up with
+        # the questions ('' next to 'AB' would keep the length but shift codes)
+        if all(isinstance(letter, str) and len(letter) == 1 for letter in letters):
+            joined = ''.join(letters)
+        else:
+            joined = None
+        if joined is not None and joined.isascii():
+            # Single ASCII letters: encode all of them in one pass
+            codes = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).astype(np.int16) - ord('A')
+            codes[(codes < 0) | (codes >= len(ANSWER_LETTER_CODES))] = cls.UNANSWERED
+            return codes.astype(np.int8)
+        return np.array([ANSWER_LETTER_CODES.get(letter, cls.UNANSWERED) for letter in letters], dtype=np.int8)
+
+    def score_many(self, answers_list: List[Dict[str, str]]) -> List[dict]:
+        """Score documents (same shape as attempt.score) for many attempts at once"""
+        if not answers_list:
+            return []
+        hits = (self.encode_answers(answers_list) == self.correct).astype(np.float32)
+        totals = hits.sum(axis=1).astype(np.int64).tolist()
+        by_area = (hits @ self._area_matrix).astype(np.int64).tolist()
+        by_subject = (hits @ self._subject_matrix).astype(np.int64).tolist()
+        
+        total_questions = len(self)
+        scores = []
+        for row, total_correct in enumerate(totals):
+            scores.append({
+                'total_correct': total_correct,
+                'total_questions': total_questions,
+                'percentage': _round_percentage(total_correct, total_questions),
+                'by_area': {
+                    name: {'correct': correct, 'total': total, 'percentage': _round_percentage(correct, total)}
+                    for name, correct, total in zip(self.areas, by_area[row], self.area_totals)
+                },
+                'by_subject': {
+                    name: {'correct': correct, 'total': total, 'percentage': _round_percentage(correct, total)}
+                    for name, correct, total in zip(self.subjects, by_subject[row], self.subject_totals)
+                }
+            })
+        return scores
+
+    def score(self, answers: Dict[str, str]) -> dict:
+        return self.score_many([answers])[0]
+
+async def load_answer_key(query: dict, limit: Optional[int] = None) -> AnswerKey:
+    """Answer key for the questions matching `query`, reading only the scoring fields"""
+    questions = await db.questions.find(query, ANSWER_KEY_PROJECTION).to_list(limit)
+    return AnswerKey([answer_key_entry(q) for q in questions])
+
+class AnswerKeyCache:
+    """LRU of exam id -> answer key, so scoring an exam doesn't refetch its questions.
+
+    An answer key holds only (question id, correct letter, area, subject) per
+    question, encoded as small arrays: a few kilobytes per exam instead of the
+    full statements.
+    Each key is stored with the exam's `content_version` and is only used
+    while that version is current, checked with one indexed read per lookup,
+    so edits made through other workers are scored right away.
+    notify_questions_changed also drops the keys of the exams it names locally.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # exam_id -> (content_version, AnswerKey)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, exam_id: str) -> AnswerKey:
+        # Version first: a key loaded after this read is at least as new as it
+        exam = await db.exams.find_one({'id': exam_id}, {'_id': 0, 'content_version': 1})
+        version = exam.get('content_version', 0) if exam else None
+        entry = self._entries.get(exam_id)
+        if entry is not None and exam is not None and entry[0] == version:
+            self._entries.move_to_end(exam_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generation
+        key = await load_answer_key({'exam_id': exam_id}, 500)
+        if exam is None:
+            self._entries.pop(exam_id, None)
+        elif generation == self._generation and self.max_entries > 0:
+            self._entries[exam_id] = (version, key)
+            self._entries.move_to_end(exam_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return key
+
+    def invalidate(self, exam_ids: Iterable[Optional[str]]):
+        self._generation += 1
+        for exam_id in exam_ids:
+            self._entries.pop(exam_id, None)
+
+    def stats(self) -> dict:
+        return {'size': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
+
+answer_key_cache = AnswerKeyCache(ANSWER_KEY_CACHE_SIZE)
+
+class ExamPayload:
+    """Pre-encoded student question list of one exam content version, plus compressed variants"""
+
+    __slots__ = ('version', 'body', 'digest', 'variants', 'checked_at')
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, bytes] = {}
+        if len(body) >= COMPRESSION_MIN_BYTES:
+            for encoding in COMPRESSION_ENCODINGS:
+                self.variants[encoding] = compress_body(body, encoding, cached=True)
+        self.checked_at = time.monotonic()
+
+    def representation(self, accept_encoding: Optional[str]) -> tuple:
+        """(body, content-coding or None, strong ETag) for a request's Accept-Encoding"""
+        encoding = negotiate_encoding(accept_encoding) if self.variants else None
+        if encoding is None:
+            return self.body, None, f'"{self.digest}"'
+        # Each encoding is its own representation, so it gets its own strong validator
+        return self.variants[encoding], encoding, f'"{self.digest}-{encoding}"'
+
+class ExamPayloadCache:
+    """LRU of published exam id -> encoded /exams/{id}/questions response.
+
+    Every change to an exam's questions or publication bumps its
+    `content_version` in MongoDB. A cached payload is served as is for
+    `revalidate_seconds`, then checked against the exam's current version with
+    one indexed read and rebuilt only if the version moved; other workers'
+    edits are therefore visible within that window. Concurrent misses for the
+    same exam share one build.
+    """
+
+    def __init__(self, max_entries: int, revalidate_seconds: float):
+        self.max_entries = max_entries
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: "OrderedDict[str, ExamPayload]" = OrderedDict()
+        self._building: Dict[tuple, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    async def get(self, exam_id: str) -> Optional[ExamPayload]:
+        """Payload of a published exam, or None if it doesn't exist or isn't published"""
+        entry = self._entries.get(exam_id)
+        if entry is not None and time.monotonic() - entry.checked_at < self.revalidate_seconds:
+            self._entries.move_to_end(exam_id)
+            self.hits += 1
+            return entry
+        
+        exam = await db.exams.find_one({'id': exam_id, 'published': True}, {'_id': 0, 'content_version': 1})
+        if not exam:
+            self._entries.pop(exam_id, None)
+            return None
+        version = exam.get('content_version', 0)
+        if entry is not None and entry.version == version:
+            entry.checked_at = time.monotonic()
+            self.revalidations += 1
+            return entry
+        
+        self.misses += 1
+        build_key = (exam_id, version)
+        building = self._building.get(build_key)
+        if building is None:
+            building = asyncio.ensure_future(self._build(exam_id, version))
+            self._building[build_key] = building
+            building.add_done_callback(lambda _: self._building.pop(build_key, None))
+        return await asyncio.shield(building)
+
+    async def _build(self, exam_id: str, version: int) -> ExamPayload:
+        generation = self._generation
+        questions = await db.questions.find(
+            {'exam_id': exam_id},
+            STUDENT_QUESTION_SHAPE.projection
+        ).sort('order', 1).to_list(500)
+        if FAST_JSON_RESPONSES:
+            body = encode_json([STUDENT_QUESTION_SHAPE.shape(q) for q in questions])
+        else:
+            body = json.dumps(
+                [QuestionResponseStudent(**q).model_dump(mode='json') for q in questions],
+                ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+        # Compression runs once per content version, off the event loop
+        entry = await asyncio.to_thread(ExamPayload, version, body)
+        if generation == self._generation and self.max_entries > 0:
+            self._entries[exam_id] = entry
+            self._entries.move_to_end(exam_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, exam_ids: Iterable[Optional[str]]):
+        self._generation += 1
+        for exam_id in exam_ids:
+            self._entries.pop(exam_id, None)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'revalidate_seconds': self.revalidate_seconds,
+            'bytes': sum(len(entry.body) for entry in self._entries.values()),
+            'compressed_bytes': sum(len(v) for entry in self._entries.values() for v in entry.variants.values()),
+            'hits': self.hits,
+            'revalidations': self.revalidations,
+            'misses': self.misses
+        }
+
+exam_payload_cache = ExamPayloadCache(EXAM_PAYLOAD_CACHE_SIZE, EXAM_PAYLOAD_REVALIDATE_SECONDS)
+
+async def bump_content_versions(exam_ids: Iterable[Optional[str]]):
+    """Mark exams' student-facing content as changed, for every worker's payload cache"""
+    exam_ids = [exam_id for exam_id in set(exam_ids) if exam_id]
+    if exam_ids:
+        await db.exams.update_many({'id': {'$in': exam_ids}}, {'$inc': {'content_version': 1}})
+    exam_payload_cache.invalidate(exam_ids)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(','))
+
+async def notify_questions_changed(
+    exam_ids: Iterable[Optional[str]] = (),
+    upserted: Iterable[dict] = (),
+    deleted_ids: Iterable[str] = ()
+):
+    """Single hook for every write to the questions collection.
+
+    Call after questions are created, updated, deleted or imported so caches
+    derived from the question bank are dropped. `exam_ids` names the exams
+    whose question sets changed (None entries are ignored); `upserted` are the
+    new or updated question documents and `deleted_ids` the removed ones.
+    """
+    exam_ids = list(exam_ids)
+    deleted_ids = list(deleted_ids)
+    question_index.apply(upserted, deleted_ids)
+    if question_index.enabled and deleted_ids:
+        # Other workers' indexes drop these on their next deletion poll
+        deleted_at = datetime.now(timezone.utc)
+        await db.question_deletions.insert_many([
+            {'question_id': question_id, 'deleted_at': deleted_at} for question_id in deleted_ids
+        ])
+    answer_key_cache.invalidate(exam_ids)
+    await bump_content_versions(exam_ids)
+    await metadata_cache.invalidate()
+
+# ===== EXAM QUESTION COUNTERS =====
+
+async def adjust_question_counts(deltas: Dict[Optional[str], int]):
+    """Apply question_count increments per exam id (None ids and zero deltas are skipped)"""
+    ops = [
+        UpdateOne({'id': exam_id}, {'$inc': {'question_count': delta}})
+        for exam_id, delta in deltas.items()
+        if exam_id and delta
+    ]
+    if ops:
+        await db.exams.bulk_write(ops, ordered=False)
+
+async def reconcile_question_counts() -> dict:
+    """Recompute every exam's question_count from the questions collection.
+
+    One-shot repair for drift (e.g. exams created before counters existed or
+    writes made outside the API). Only exams whose count changed are written.
+    """
+    actual: Dict[str, int] = {}
+    pipeline = [
+        {'$match': {'exam_id': {'$ne': None}}},
+        {'$group': {'_id': '$exam_id', 'count': {'$sum': 1}}}
+    ]
+    async for row in db.questions.aggregate(pipeline):
+        actual[row['_id']] = row['count']
+    
+    checked = 0
+    ops = []
+    async for exam in db.exams.find({}, {'_id': 0, 'id': 1, 'question_count': 1}):
+        checked += 1
+        count = actual.get(exam['id'], 0)
+        if exam.get('question_count') != count:
+            ops.append(UpdateOne({'id': exam['id']}, {'$set': {'question_count': count}}))
+    
+    if ops:
+        await db.exams.bulk_write(ops, ordered=False)
+    
+    return {'exams_checked': checked, 'exams_updated': len(ops)}
+
+async def backfill_question_counts() -> int:
+    """Set question_count on exams that don't have one yet (created before the counter existed).
+
+    Runs at startup so create_question never derives a new question's order
+    from a missing counter. `$max` keeps a counter another worker already
+    bumped from going backwards.
+    """
+    exam_ids = [exam['id'] async for exam in db.exams.find({'question_count': {'$exists': False}}, {'_id': 0, 'id': 1})]
+    if not exam_ids:
+        return 0
+    counts = {exam_id: 0 for exam_id in exam_ids}
+    pipeline = [
+        {'$match': {'exam_id': {'$in': exam_ids}}},
+        {'$group': {'_id': '$exam_id', 'count': {'$sum': 1}}}
+    ]
+    async for row in db.questions.aggregate(pipeline):
+        counts[row['_id']] = row['count']
+    await db.exams.bulk_write([
+        UpdateOne({'id': exam_id}, {'$max': {'question_count': count}})
+        for exam_id, count in counts.items()
+    ], ordered=False)
+    return len(counts)
+
 # ===== ADMIN EXAM ROUTES =====
 
 @api_router.post("/admin/exams", response_model=ExamResponse)
@@ -418,35 +1640,30 @@ async def create_exam(exam_data: ExamCreate, current_user: dict = Depends(get_cu
         'areas': exam_data.areas,
         'education_level': exam_data.education_level or 'vestibular',
         'published': False,
+        'question_count': 0,
+        'content_version': 0,
         'created_by': current_user['id'],
         'created_at': datetime.now(timezone.utc).isoformat()
     }
     
     await db.exams.insert_one(exam_doc)
-    return ExamResponse(**exam_doc, question_count=0)
+    return ExamResponse(**exam_doc)
 
 @api_router.get("/admin/exams", response_model=List[ExamResponse])
-async def get_admin_exams(current_user: dict = Depends(get_current_user)):
+async def get_admin_exams(
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    limit: int = 200,
+    cursor: Optional[str] = None
+):
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Admin access required')
     
-    # OPTIMIZED: Use aggregation with $lookup to avoid N+1 queries
-    pipeline = [
-        {'$lookup': {
-            'from': 'questions',
-            'localField': 'id',
-            'foreignField': 'exam_id',
-            'as': 'questions_list'
-        }},
-        {'$addFields': {
-            'question_count': {'$size': '$questions_list'},
-            'education_level': {'$ifNull': ['$education_level', 'vestibular']}
-        }},
-        {'$project': {'questions_list': 0, '_id': 0}},
-        {'$sort': {'created_at': -1}}
-    ]
-    
-    exams = await db.exams.aggregate(pipeline).to_list(200)
+    # OPTIMIZED: question_count is materialized on the exam document; keyset pages on (created_at, id)
+    exams, next_cursor = await keyset_page(
+        db.exams, {}, {'_id': 0}, 'created_at', -1, page_size(limit, 200), cursor
+    )
+    response.headers.update(next_cursor_headers(next_cursor))
     return [ExamResponse(**exam) for exam in exams]
 
 @api_router.get("/admin/exams/{exam_id}", response_model=ExamResponse)
@@ -458,11 +1675,6 @@ async def get_admin_exam(exam_id: str, current_user: dict = Depends(get_current_
     if not exam:
         raise HTTPException(status_code=404, detail='Exam not found')
     
-    count = await db.questions.count_documents({'exam_id': exam_id})
-    exam['question_count'] = count
-    if 'education_level' not in exam:
-        exam['education_level'] = 'vestibular'
-    
     return ExamResponse(**exam)
 
 @api_router.put("/admin/exams/{exam_id}", response_model=ExamResponse)
@@ -480,9 +1692,6 @@ async def update_exam(exam_id: str, exam_data: ExamCreate, current_user: dict =
         raise HTTPException(status_code=404, detail='Exam not found')
     
     exam = await db.exams.find_one({'id': exam_id}, {'_id': 0})
-    count = await db.questions.count_documents({'exam_id': exam_id})
-    exam['question_count'] = count
-    
     return ExamResponse(**exam)
 
 @api_router.delete("/admin/exams/{exam_id}")
@@ -490,8 +1699,12 @@ async def delete_exam(exam_id: str, current_user: dict = Depends(get_current_use
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Admin access required')
     
+    deleted_ids = []
+    if question_index.enabled:
+        deleted_ids = [q['id'] async for q in db.questions.find({'exam_id': exam_id}, {'_id': 0, 'id': 1})]
     await db.questions.delete_many({'exam_id': exam_id})
     result = await db.exams.delete_one({'id': exam_id})
+    await notify_questions_changed([exam_id], deleted_ids=deleted_ids)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail='Exam not found')
     
@@ -504,11 +1717,12 @@ async def publish_exam(exam_id: str, current_user: dict = Depends(get_current_us
     
     result = await db.exams.update_one(
         {'id': exam_id},
-        {'$set': {'published': True}}
+        {'$set': {'published': True}, '$inc': {'content_version': 1}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail='Exam not found')
+    exam_payload_cache.invalidate([exam_id])
     
     return {'message': 'Exam published successfully'}
 
@@ -519,11 +1733,12 @@ async def unpublish_exam(exam_id: str, current_user: dict = Depends(get_current_
     
     result = await db.exams.update_one(
         {'id': exam_id},
-        {'$set': {'published': False}}
+        {'$set': {'published': False}, '$inc': {'content_version': 1}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail='Exam not found')
+    exam_payload_cache.invalidate([exam_id])
     
     return {'message': 'Exam unpublished successfully'}
 
@@ -534,7 +1749,15 @@ async def create_question(question_data: QuestionCreate, current_user: dict = De
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Admin access required')
     
-    count = await db.questions.count_documents({'exam_id': question_data.exam_id})
+    # Atomically bump the exam's question counter; the new value is this question's order
+    exam = await db.exams.find_one_and_update(
+        {'id': question_data.exam_id},
+        {'$inc': {'question_count': 1}},
+        projection={'_id': 0, 'question_count': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not exam:
+        raise HTTPException(status_code=404, detail='Exam not found')
     
     question_id = str(uuid.uuid4())
     question_doc = {
@@ -547,7 +1770,7 @@ async def create_question(question_data: QuestionCreate, current_user: dict = De
         'tags': question_data.tags,
         'difficulty': question_data.difficulty,
         'area': question_data.area,
-        'order': count + 1,
+        'order': exam['question_count'],
         'subject': question_data.area,
         'topic': '',
         'education_level': 'vestibular',
@@ -563,18 +1786,28 @@ async def create_question(question_data: QuestionCreate, current_user: dict = De
     }
     
     await db.questions.insert_one(question_doc)
+    await notify_questions_changed([question_data.exam_id], upserted=[question_doc])
     return QuestionResponse(**question_doc)
 
 @api_router.get("/admin/exams/{exam_id}/questions", response_model=List[QuestionResponse])
-async def get_admin_questions(exam_id: str, current_user: dict = Depends(get_current_user)):
+async def get_admin_questions(
+    exam_id: str,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    limit: int = 500,
+    cursor: Optional[str] = None
+):
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Admin access required')
     
-    # OPTIMIZED: Reasonable limit for exam questions (most exams have <200 questions)
-    questions = await db.questions.find(
-        {'exam_id': exam_id}, 
-        {'_id': 0}
-    ).sort('order', 1).to_list(500)
+    # OPTIMIZED: keyset pages on (exam_id, order, id); most exams fit in one page
+    questions, next_cursor = await keyset_page(
+        db.questions, {'exam_id': exam_id}, QUESTION_SHAPE.projection, 'order', 1, page_size(limit, 500), cursor
+    )
+    headers = next_cursor_headers(next_cursor)
+    if FAST_JSON_RESPONSES:
+        return json_bytes_response(encode_json([QUESTION_SHAPE.shape(q) for q in questions]), headers)
+    response.headers.update(headers)
     return [QuestionResponse(**q) for q in questions]
 
 @api_router.put("/admin/questions/{question_id}", response_model=QuestionResponse)
@@ -595,7 +1828,11 @@ async def update_question(question_id: str, question_data: QuestionCreate, curre
         {'$set': update_data}
     )
     
+    # Keep materialized counters right when a question moves between exams
+    if existing.get('exam_id') != question_data.exam_id:
+        await adjust_question_counts({existing.get('exam_id'): -1, question_data.exam_id: 1})
     question = await db.questions.find_one({'id': question_id}, {'_id': 0})
+    await notify_questions_changed([existing.get('exam_id'), question_data.exam_id], upserted=[question])
     return QuestionResponse(**question)
 
 @api_router.delete("/admin/questions/{question_id}")
@@ -603,67 +1840,126 @@ async def delete_question(question_id: str, current_user: dict = Depends(get_cur
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Admin access required')
     
-    result = await db.questions.delete_one({'id': question_id})
-    if result.deleted_count == 0:
+    deleted = await db.questions.find_one_and_delete({'id': question_id}, projection={'_id': 0, 'id': 1, 'exam_id': 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail='Question not found')
     
+    await adjust_question_counts({deleted.get('exam_id'): -1})
+    await notify_questions_changed([deleted.get('exam_id')], deleted_ids=[question_id])
+    
     return {'message': 'Question deleted successfully'}
 
 # ===== ADMIN IMPORT QUESTIONS =====
 
-@api_router.post("/admin/import/questions")
-async def import_questions(import_data: ImportQuestionsRequest, current_user: dict = Depends(get_current_user)):
-    if current_user['role'] != 'admin':
-        raise HTTPException(status_code=403, detail='Admin access required')
-    
-    inserted = 0
+def build_import_question_doc(q: QuestionImport, q_hash: str, created_at: str) -> dict:
+    """Build the stored question document for an imported row"""
+    return {
+        'id': str(uuid.uuid4()),
+        'exam_id': q.exam_id,
+        'statement': q.statement,
+        'image_url': q.image_url,
+        'alternatives': [alt.model_dump() for alt in q.alternatives],
+        'correct_answer': q.correct_answer,
+        'tags': q.tags,
+        'difficulty': q.difficulty,
+        'area': q.area,
+        'subject': normalize_subject(q.subject),
+        'topic': q.topic.strip() if q.topic else '',
+        'education_level': q.education_level,
+        'source_exam': q.source_exam.strip() if q.source_exam else '',
+        'year': q.year,
+        'question_hash': q_hash,
+        'order': 0,
+        'created_at': created_at
+    }
+
+async def import_question_batch(rows: List[tuple], label: str = 'Question') -> dict:
+    """Insert one batch of (row_number, QuestionImport) pairs.
+
+    Duplicates within the batch are dropped up front, duplicates already in the
+    bank are resolved with a single $in query, and the rest go out in one
+    unordered insert_many. Rows that still collide on the unique question_hash
+    index (e.g. a concurrent import) are counted as duplicates; any other
+    per-row write error is reported against its row number.
+    """
+    created_at = datetime.now(timezone.utc).isoformat()
     skipped_duplicates = 0
     errors = []
     
-    for idx, q in enumerate(import_data.questions):
-        # Normalize subject
-        subject = normalize_subject(q.subject)
-        
-        # Calculate hash
+    candidates = []
+    seen_hashes = set()
+    for idx, q in rows:
         q_hash = calculate_question_hash(
             q.statement,
             [alt.model_dump() for alt in q.alternatives],
             q.source_exam,
             q.year
         )
-        
-        # Check for duplicate
-        existing = await db.questions.find_one({'question_hash': q_hash})
-        if existing:
+        if q_hash in seen_hashes:
             skipped_duplicates += 1
             continue
-        
-        question_id = str(uuid.uuid4())
-        question_doc = {
-            'id': question_id,
-            'exam_id': q.exam_id,
-            'statement': q.statement,
-            'image_url': q.image_url,
-            'alternatives': [alt.model_dump() for alt in q.alternatives],
-            'correct_answer': q.correct_answer,
-            'tags': q.tags,
-            'difficulty': q.difficulty,
-            'area': q.area,
-            'subject': subject,
-            'topic': q.topic.strip() if q.topic else '',
-            'education_level': q.education_level,
-            'source_exam': q.source_exam.strip() if q.source_exam else '',
-            'year': q.year,
-            'question_hash': q_hash,
-            'order': 0,
-            'created_at': datetime.now(timezone.utc).isoformat()
-        }
-        
+        seen_hashes.add(q_hash)
+        candidates.append((idx, build_import_question_doc(q, q_hash, created_at)))
+    
+    existing_hashes = set()
+    if seen_hashes:
+        cursor = db.questions.find({'question_hash': {'$in': list(seen_hashes)}}, {'_id': 0, 'question_hash': 1})
+        async for doc in cursor:
+            existing_hashes.add(doc['question_hash'])
+    
+    to_insert = [(idx, doc) for idx, doc in candidates if doc['question_hash'] not in existing_hashes]
+    skipped_duplicates += len(candidates) - len(to_insert)
+    
+    failed_positions = set()
+    if to_insert:
         try:
-            await db.questions.insert_one(question_doc)
-            inserted += 1
-        except Exception as e:
-            errors.append(f"Question {idx}: {str(e)}")
+            await db.questions.insert_many([doc for _, doc in to_insert], ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                position = write_error['index']
+                failed_positions.add(position)
+                if write_error.get('code') == 11000:
+                    skipped_duplicates += 1
+                else:
+                    errors.append(f"{label} {to_insert[position][0]}: {write_error.get('errmsg')}")
+    
+    inserted_docs = [doc for position, (_, doc) in enumerate(to_insert) if position not in failed_positions]
+    inserted_by_exam: Dict[str, int] = {}
+    for doc in inserted_docs:
+        if doc['exam_id']:
+            inserted_by_exam[doc['exam_id']] = inserted_by_exam.get(doc['exam_id'], 0) + 1
+    await adjust_question_counts(inserted_by_exam)
+    if inserted_docs:
+        await notify_questions_changed({doc['exam_id'] for doc in inserted_docs}, upserted=inserted_docs)
+    
+    return {
+        'inserted': len(inserted_docs),
+        'skipped_duplicates': skipped_duplicates,
+        'errors': errors
+    }
+
+@api_router.post("/admin/import/questions")
+async def import_questions(
+    import_data: ImportQuestionsRequest,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    batch_size = max(1, min(batch_size, 5000))
+    inserted = 0
+    skipped_duplicates = 0
+    errors = []
+    
+    rows = list(enumerate(import_data.questions))
+    for start in range(0, len(rows), batch_size):
+        # Earlier batches are committed, so the $in lookup also catches
+        # duplicates that span batch boundaries
+        result = await import_question_batch(rows[start:start + batch_size])
+        inserted += result['inserted']
+        skipped_duplicates += result['skipped_duplicates']
+        errors.extend(result['errors'])
     
     return {
         'inserted': inserted,
@@ -671,109 +1967,489 @@ async def import_questions(import_data: ImportQuestionsRequest, current_user: di
         'errors': errors if errors else None
     }
 
-# ===== STUDENT EXAM ROUTES =====
+def format_validation_error(e: ValidationError) -> str:
+    return '; '.join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'body'}: {err['msg']}"
+        for err in e.errors()
+    )
 
-@api_router.get("/exams", response_model=List[ExamResponse])
-async def get_exams(current_user: dict = Depends(get_current_user)):
-    # OPTIMIZED: Use aggregation with $lookup to avoid N+1 queries
-    pipeline = [
-        {'$match': {'published': True}},
-        {'$lookup': {
-            'from': 'questions',
-            'localField': 'id',
-            'foreignField': 'exam_id',
-            'as': 'questions_list'
-        }},
-        {'$addFields': {
-            'question_count': {'$size': '$questions_list'},
-            'education_level': {'$ifNull': ['$education_level', 'vestibular']}
-        }},
-        {'$project': {'questions_list': 0, '_id': 0}},
-        {'$sort': {'year': -1}}
-    ]
-    
-    exams = await db.exams.aggregate(pipeline).to_list(100)
-    return [ExamResponse(**exam) for exam in exams]
+@api_router.post("/admin/import/questions/ndjson")
+async def import_questions_ndjson(
+    request: Request,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    current_user: dict = Depends(get_current_user)
+):
+    """Import newline-delimited JSON questions from a streamed request body.
 
-@api_router.get("/exams/{exam_id}", response_model=ExamResponse)
-async def get_exam(exam_id: str, current_user: dict = Depends(get_current_user)):
-    exam = await db.exams.find_one({'id': exam_id, 'published': True}, {'_id': 0})
-    if not exam:
-        raise HTTPException(status_code=404, detail='Exam not found')
+    Each line is validated as a QuestionImport as it arrives and rows are
+    flushed to MongoDB every `batch_size` lines, so memory stays bounded by
+    one batch no matter how large the upload is.
+    """
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
     
-    count = await db.questions.count_documents({'exam_id': exam_id})
-    exam['question_count'] = count
-    if 'education_level' not in exam:
-        exam['education_level'] = 'vestibular'
+    batch_size = max(1, min(batch_size, 5000))
+    started = time.monotonic()
+    report = {'lines': 0, 'batches': 0, 'inserted': 0, 'skipped_duplicates': 0, 'invalid': 0, 'error_count': 0}
+    errors: List[str] = []
+    batch: List[tuple] = []
     
-    return ExamResponse(**exam)
-
-@api_router.get("/exams/{exam_id}/questions", response_model=List[QuestionResponseStudent])
-async def get_exam_questions(exam_id: str, current_user: dict = Depends(get_current_user)):
-    exam = await db.exams.find_one({'id': exam_id, 'published': True}, {'_id': 0})
-    if not exam:
-        raise HTTPException(status_code=404, detail='Exam not found')
+    def add_error(message: str):
+        report['error_count'] += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append(message)
     
-    # OPTIMIZED: Reasonable limit for exam questions
-    questions = await db.questions.find(
-        {'exam_id': exam_id}, 
-        {'_id': 0, 'correct_answer': 0, 'question_hash': 0}
-    ).sort('order', 1).to_list(500)
-    return [QuestionResponseStudent(**q) for q in questions]
-
-# ===== SIMULATION ROUTES =====
+    async def flush():
+        result = await import_question_batch(batch, label='Line')
+        report['batches'] += 1
+        report['inserted'] += result['inserted']
+        report['skipped_duplicates'] += result['skipped_duplicates']
+        for message in result['errors']:
+            add_error(message)
+        batch.clear()
+    
+    def parse_line(raw: bytes):
+        report['lines'] += 1
+        line_no = report['lines']
+        if not raw.strip():
+            return
+        try:
+            batch.append((line_no, QuestionImport.model_validate_json(raw)))
+        except ValidationError as e:
+            report['invalid'] += 1
+            add_error(f"Line {line_no}: {format_validation_error(e)}")
+    
+    pending = b''
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for raw in lines:
+            parse_line(raw)
+            if len(batch) >= batch_size:
+                await flush()
+        if len(pending) > IMPORT_MAX_LINE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Line {report['lines'] + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes (imported so far: {report['inserted']})"
+            )
+    if pending.strip():
+        parse_line(pending)
+    if batch:
+        await flush()
+    
+    elapsed = time.monotonic() - started
+    return {
+        **report,
+        'elapsed_seconds': round(elapsed, 3),
+        'errors': errors if errors else None,
+        'errors_truncated': report['error_count'] > len(errors)
+    }
 
-@api_router.post("/simulations/generate", response_model=SimulationResponse)
-async def generate_simulation(criteria: SimulationGenerateRequest, current_user: dict = Depends(get_current_user)):
-    """Generate a custom simulation based on criteria"""
+# ===== BACKGROUND IMPORT JOBS =====
+#
+# A job is an `import_jobs` document plus its rows split into
+# `import_job_batches` documents. A worker leases the job, imports batch
+# `next_batch`, then advances `next_batch` and the counters in one update
+# and drops the batch document. If the worker dies, the lease expires and
+# any worker's supervisor resumes from the last committed batch; rows of a
+# half-written batch are simply re-detected as duplicates.
+
+WORKER_ID = str(uuid.uuid4())
+_background_tasks: set = set()
+
+def spawn_background(coro):
+    """Run a coroutine detached from the request, keeping a reference so it isn't GC'd"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def _lease_expiry() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=IMPORT_JOB_LEASE_SECONDS)).isoformat()
+
+# Jobs this process is running; its own lease never lets it start a second runner
+_running_import_jobs: set = set()
+
+async def claim_import_job(job_id: str) -> Optional[dict]:
+    """Take the lease on a pending job unless a live worker (this one included) holds it"""
+    now = datetime.now(timezone.utc).isoformat()
+    lease = {'status': 'running', 'lease_owner': WORKER_ID, 'lease_until': _lease_expiry()}
+    job = await db.import_jobs.find_one_and_update(
+        {
+            'id': job_id,
+            'status': {'$in': ['queued', 'running']},
+            '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]
+        },
+        {'$set': lease},
+        projection={'_id': 0}
+    )
+    return {**job, **lease} if job else None
+
+async def run_import_job(job_id: str):
+    # The supervisor can race create_import_job's launch, or find this process's
+    # own lease expired during a slow batch: never run a job twice here
+    if job_id in _running_import_jobs:
+        return
+    _running_import_jobs.add(job_id)
+    try:
+        await _run_import_job(job_id)
+    finally:
+        _running_import_jobs.discard(job_id)
+
+async def _run_import_job(job_id: str):
+    job = await claim_import_job(job_id)
+    if not job:
+        return
     
-    # Build match pipeline
-    match_conditions = []
+    started_at = job.get('started_at') or datetime.now(timezone.utc).isoformat()
+    if not job.get('started_at'):
+        await db.import_jobs.update_one({'id': job_id}, {'$set': {'started_at': started_at}})
+    started = datetime.fromisoformat(started_at)
+    processed = job.get('processed', 0)
     
-    if criteria.subjects:
-        # Validate subjects for public endpoints
-        normalized_subjects = [normalize_subject(s) for s in criteria.subjects]
-        for s in normalized_subjects:
-            if s not in VALID_SUBJECTS:
-                raise HTTPException(status_code=400, detail=f'Invalid subject: {s}')
-        match_conditions.append({'subject': {'$in': normalized_subjects}})
+    try:
+        for batch_no in range(job['next_batch'], job['total_batches']):
+            batch_doc = await db.import_job_batches.find_one({'job_id': job_id, 'batch': batch_no}, {'_id': 0})
+            rows = [(row['row'], QuestionImport.model_validate(row['question'])) for row in (batch_doc or {}).get('rows', [])]
+            result = await import_question_batch(rows)
+            
+            processed += len(rows)
+            elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+            update = {
+                '$inc': {
+                    'processed': len(rows),
+                    'inserted': result['inserted'],
+                    'skipped_duplicates': result['skipped_duplicates'],
+                    'error_count': len(result['errors'])
+                },
+                '$set': {
+                    'next_batch': batch_no + 1,
+                    'rows_per_second': round(processed / elapsed, 1) if elapsed > 0 else None,
+                    'lease_until': _lease_expiry(),
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                }
+            }
+            if result['errors']:
+                update['$push'] = {'errors': {'$each': result['errors'], '$slice': IMPORT_MAX_REPORTED_ERRORS}}
+            
+            committed = await db.import_jobs.update_one(
+                {'id': job_id, 'lease_owner': WORKER_ID, 'next_batch': batch_no},
+                update
+            )
+            if committed.matched_count == 0:
+                logger.warning(f"Import job {job_id} lease lost at batch {batch_no}")
+                return
+            await db.import_job_batches.delete_one({'job_id': job_id, 'batch': batch_no})
+        
+        await db.import_jobs.update_one(
+            {'id': job_id, 'lease_owner': WORKER_ID},
+            {'$set': {
+                'status': 'completed',
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'lease_owner': None,
+                'lease_until': None
+            }}
+        )
+    except Exception as e:
+        logger.exception(f"Import job {job_id} failed: {e}")
+        await db.import_jobs.update_one(
+            {'id': job_id, 'lease_owner': WORKER_ID},
+            {'$set': {
+                'status': 'failed',
+                'failure': str(e),
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'lease_owner': None,
+                'lease_until': None
+            }}
+        )
+
+async def resume_import_jobs():
+    """Pick up queued jobs and jobs whose worker stopped renewing its lease"""
+    now = datetime.now(timezone.utc).isoformat()
+    cursor = db.import_jobs.find(
+        {
+            'status': {'$in': ['queued', 'running']},
+            '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]
+        },
+        {'_id': 0, 'id': 1}
+    )
+    async for job in cursor:
+        spawn_background(run_import_job(job['id']))
+
+async def import_job_supervisor():
+    while True:
+        try:
+            await resume_import_jobs()
+        except Exception as e:
+            logger.exception(f"Import job supervisor error: {e}")
+        await asyncio.sleep(IMPORT_JOB_POLL_SECONDS)
+
+@api_router.post("/admin/import/jobs")
+async def create_import_job(
+    import_data: ImportQuestionsRequest,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    current_user: dict = Depends(get_current_user)
+):
+    """Queue an import to run in the background; poll GET /admin/import/jobs/{id} for progress"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
     
-    if criteria.topics:
-        match_conditions.append({'topic': {'$in': criteria.topics}})
+    batch_size = max(1, min(batch_size, 5000))
+    job_id = str(uuid.uuid4())
+    rows = [{'row': idx, 'question': q.model_dump()} for idx, q in enumerate(import_data.questions)]
+    batches = [
+        {'job_id': job_id, 'batch': n, 'rows': rows[start:start + batch_size]}
+        for n, start in enumerate(range(0, len(rows), batch_size))
+    ]
+    if batches:
+        await db.import_job_batches.insert_many(batches)
     
-    if criteria.education_level:
-        if criteria.education_level not in EDUCATION_LEVELS:
-            raise HTTPException(status_code=400, detail=f'Invalid education_level: {criteria.education_level}')
-        match_conditions.append({'education_level': criteria.education_level})
+    job_doc = {
+        'id': job_id,
+        'status': 'queued',
+        'total': len(rows),
+        'batch_size': batch_size,
+        'total_batches': len(batches),
+        'next_batch': 0,
+        'processed': 0,
+        'inserted': 0,
+        'skipped_duplicates': 0,
+        'error_count': 0,
+        'errors': [],
+        'rows_per_second': None,
+        'lease_owner': None,
+        'lease_until': None,
+        'created_by': current_user['id'],
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'started_at': None,
+        'updated_at': None,
+        'finished_at': None
+    }
+    await db.import_jobs.insert_one(job_doc)
     
-    if criteria.difficulty:
-        if criteria.difficulty not in DIFFICULTIES:
-            raise HTTPException(status_code=400, detail=f'Invalid difficulty: {criteria.difficulty}')
-        match_conditions.append({'difficulty': criteria.difficulty})
+    spawn_background(run_import_job(job_id))
+    return {'job_id': job_id, 'status': 'queued', 'total': len(rows), 'total_batches': len(batches)}
+
+@api_router.get("/admin/import/jobs/{job_id}")
+async def get_import_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
     
-    if criteria.sources:
-        match_conditions.append({'source_exam': {'$in': criteria.sources}})
+    job = await db.import_jobs.find_one({'id': job_id}, {'_id': 0, 'lease_owner': 0})
+    if not job:
+        raise HTTPException(status_code=404, detail='Import job not found')
     
-    if criteria.year_range and len(criteria.year_range) == 2:
-        match_conditions.append({
-            'year': {'$gte': criteria.year_range[0], '$lte': criteria.year_range[1]}
-        })
+    return job
+
+# ===== STUDENT EXAM ROUTES =====
+
+@api_router.get("/exams", response_model=List[ExamResponse])
+async def get_exams(current_user: dict = Depends(get_current_user)):
+    # OPTIMIZED: question_count is materialized, served by the (published, year) index
+    exams = await db.exams.find({'published': True}, {'_id': 0}).sort('year', -1).to_list(100)
+    return [ExamResponse(**exam) for exam in exams]
+
+@api_router.get("/exams/{exam_id}", response_model=ExamResponse)
+async def get_exam(exam_id: str, current_user: dict = Depends(get_current_user)):
+    exam = await db.exams.find_one({'id': exam_id, 'published': True}, {'_id': 0})
+    if not exam:
+        raise HTTPException(status_code=404, detail='Exam not found')
     
-    # Build aggregation pipeline
-    pipeline = []
+    return ExamResponse(**exam)
+
+@api_router.get("/exams/{exam_id}/questions", response_model=List[QuestionResponseStudent])
+async def get_exam_questions(exam_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    # OPTIMIZED: pre-encoded per content version; repeat visitors revalidate with If-None-Match
+    payload = await exam_payload_cache.get(exam_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail='Exam not found')
     
-    if match_conditions:
-        pipeline.append({'$match': {'$and': match_conditions}})
+    body, encoding, etag = payload.representation(request.headers.get('accept-encoding'))
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Accept-Encoding'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type='application/json', headers=headers)
+
+# ===== SIMULATION ROUTES =====
+
+async def sample_question_ids(k: int, filters: dict) -> List[str]:
+    """Draw up to k random question ids matching the filters.
+
+    Uses the in-process filter index when it is built: the matching ordinals
+    are cached per criteria signature and k of them are drawn with Floyd's
+    algorithm, so no database round-trip is needed. Otherwise falls back to a
+    $match + $sample aggregation. A question another worker deleted can still
+    be drawn from the index until the next deletion poll
+    (QUESTION_INDEX_DELETE_POLL_SECONDS); the simulation then simply shows one
+    question fewer, as its questions are read with $in.
+    """
+    if question_index.ready:
+        return question_index.sample(k, **filters)
     
-    # Use $sample for random selection - efficient MongoDB aggregation
-    pipeline.append({'$sample': {'size': criteria.limit}})
+    pipeline = []
+    match = combine_filters(build_question_filters(**filters))
+    if match:
+        pipeline.append({'$match': match})
+    pipeline.append({'$sample': {'size': k}})
     pipeline.append({'$project': {'_id': 0, 'id': 1}})
     
-    # Execute aggregation
-    cursor = db.questions.aggregate(pipeline)
-    results = await cursor.to_list(criteria.limit)
+    results = await db.questions.aggregate(pipeline).to_list(k)
+    return [r['id'] for r in results]
+
+def apportion(
+    total: int,
+    weights: Dict[Any, float],
+    capacity: Dict[Any, int],
+    priority: Optional[Dict[Any, float]] = None
+) -> Dict[Any, int]:
+    """Split `total` across keys proportionally to `weights` without exceeding `capacity`.
+
+    Largest-remainder rounding, with ties going to the highest `priority`;
+    whatever a full key can't take is handed to the others in proportion to
+    their weights, so the result sums to min(total, available capacity of keys
+    with positive weight).
+    """
+    priority = priority or {}
+    quotas = {key: 0 for key in weights}
+    active = {key for key, weight in weights.items() if weight > 0 and capacity.get(key, 0) > 0}
+    remaining = min(total, sum(capacity[key] for key in active))
+    while remaining > 0 and active:
+        weight_sum = sum(weights[key] for key in active)
+        shares = {key: remaining * weights[key] / weight_sum for key in active}
+        given = 0
+        for key in active:
+            take = min(int(shares[key]), capacity[key] - quotas[key])
+            quotas[key] += take
+            given += take
+        remaining -= given
+        if given == 0:
+            # Every share rounded down to zero: hand out single seats by largest remainder
+            for key in sorted(active, key=lambda k: (shares[k] - int(shares[k]), priority.get(k, 0), weights[k]), reverse=True):
+                if remaining == 0:
+                    break
+                quotas[key] += 1
+                remaining -= 1
+        active = {key for key in active if quotas[key] < capacity[key]}
+    return quotas
+
+async def stratified_question_ids(
+    limit: int,
+    filters: dict,
+    subject_weights: Dict[str, float],
+    difficulty_weights: Dict[str, float]
+) -> List[str]:
+    """Draw a simulation balanced across subjects, then across difficulties within each subject.
+
+    Quotas come from `apportion` over the questions available per
+    (subject, difficulty) stratum. With the filter index, strata counts and
+    draws are bitset operations; otherwise one $group counts the strata and
+    one $facet draws every stratum's $sample, i.e. two round-trips no matter
+    how many strata there are.
+    """
+    # A stratum is an exact (subject, difficulty) value pair, missing values
+    # included, on both paths, so quotas don't depend on QUESTION_INDEX_ENABLED
+    if question_index.ready:
+        available = question_index.strata(**filters)
+    else:
+        pipeline = []
+        match = combine_filters(build_question_filters(**filters))
+        if match:
+            pipeline.append({'$match': match})
+        pipeline.append({'$group': {'_id': {'subject': '$subject', 'difficulty': '$difficulty'}, 'count': {'$sum': 1}}})
+        available = {}
+        async for row in db.questions.aggregate(pipeline):
+            # Missing and null values group separately but are one stratum (and one $match)
+            stratum = (row['_id'].get('subject'), row['_id'].get('difficulty'))
+            available[stratum] = available.get(stratum, 0) + row['count']
     
-    question_ids = [r['id'] for r in results]
+    by_subject: Dict[Any, int] = {}
+    for (subject, _), count in available.items():
+        by_subject[subject] = by_subject.get(subject, 0) + count
+    subject_quotas = apportion(
+        limit,
+        {subject: subject_weights.get(subject, 1.0) for subject in by_subject},
+        by_subject
+    )
+    
+    quotas: Dict[tuple, int] = {}
+    difficulty_totals: Dict[Any, int] = {}
+    for subject, subject_quota in subject_quotas.items():
+        strata = {difficulty: count for (s, difficulty), count in available.items() if s == subject}
+        # Rounding ties go to the difficulties with fewest seats so far, keeping the overall mix balanced too
+        difficulty_quotas = apportion(
+            subject_quota,
+            {difficulty: difficulty_weights.get(difficulty, 1.0) for difficulty in strata},
+            strata,
+            priority={difficulty: -difficulty_totals.get(difficulty, 0) for difficulty in strata}
+        )
+        for difficulty, quota in difficulty_quotas.items():
+            if quota:
+                quotas[(subject, difficulty)] = quota
+                difficulty_totals[difficulty] = difficulty_totals.get(difficulty, 0) + quota
+    
+    if not quotas:
+        return []
+    
+    if question_index.ready:
+        question_ids = []
+        for (subject, difficulty), quota in quotas.items():
+            question_ids.extend(question_index.sample(quota, stratum=(subject, difficulty), **filters))
+    else:
+        facets = {
+            f's{n}': [
+                {'$match': {'subject': subject, 'difficulty': difficulty}},
+                {'$sample': {'size': quota}},
+                {'$project': {'_id': 0, 'id': 1}}
+            ]
+            for n, ((subject, difficulty), quota) in enumerate(quotas.items())
+        }
+        pipeline = [{'$match': match}] if match else []
+        # Only the stratum fields and ids flow into the facets, not whole questions
+        pipeline.append({'$project': {'_id': 0, 'id': 1, 'subject': 1, 'difficulty': 1}})
+        pipeline.append({'$facet': facets})
+        result = await db.questions.aggregate(pipeline).to_list(1)
+        question_ids = [row['id'] for rows in (result[0] if result else {}).values() for row in rows]
+    
+    random.shuffle(question_ids)
+    return question_ids
+
+@api_router.post("/simulations/generate", response_model=SimulationResponse)
+async def generate_simulation(criteria: SimulationGenerateRequest, current_user: dict = Depends(get_current_user)):
+    """Generate a custom simulation based on criteria"""
+    
+    normalized_subjects = None
+    if criteria.subjects:
+        # Validate subjects for public endpoints
+        normalized_subjects = [normalize_subject(s) for s in criteria.subjects]
+        for s in normalized_subjects:
+            if s not in VALID_SUBJECTS:
+                raise HTTPException(status_code=400, detail=f'Invalid subject: {s}')
+    
+    if criteria.education_level and criteria.education_level not in EDUCATION_LEVELS:
+        raise HTTPException(status_code=400, detail=f'Invalid education_level: {criteria.education_level}')
+    
+    if criteria.difficulty and criteria.difficulty not in DIFFICULTIES:
+        raise HTTPException(status_code=400, detail=f'Invalid difficulty: {criteria.difficulty}')
+    
+    filters = {
+        'subjects': normalized_subjects,
+        'topics': criteria.topics,
+        'education_level': criteria.education_level,
+        'difficulty': criteria.difficulty,
+        'sources': criteria.sources,
+        'year_range': criteria.year_range
+    }
+    if criteria.type == 'mixed':
+        question_ids = await stratified_question_ids(
+            criteria.limit,
+            filters,
+            subject_weights={normalize_subject(k): v for k, v in (criteria.subject_weights or {}).items()},
+            difficulty_weights=criteria.difficulty_weights or {}
+        )
+    else:
+        question_ids = await sample_question_ids(criteria.limit, filters)
     
     if len(question_ids) < 1:
         raise HTTPException(
@@ -781,17 +2457,6 @@ async def generate_simulation(criteria: SimulationGenerateRequest, current_user:
             detail='Não há questões suficientes com os filtros selecionados'
         )
     
-    # VALIDATION: Verify all question_ids actually exist (defensive check)
-    existing_count = await db.questions.count_documents({'id': {'$in': question_ids}})
-    if existing_count != len(question_ids):
-        logger.warning(f"Question ID mismatch: expected {len(question_ids)}, found {existing_count}")
-        # Re-fetch valid IDs only
-        valid_questions = await db.questions.find(
-            {'id': {'$in': question_ids}}, 
-            {'_id': 0, 'id': 1}
-        ).to_list(len(question_ids))
-        question_ids = [q['id'] for q in valid_questions]
-    
     # Create simulation
     simulation_id = str(uuid.uuid4())
     simulation_doc = {
@@ -804,6 +2469,7 @@ async def generate_simulation(criteria: SimulationGenerateRequest, current_user:
     }
     
     await db.simulations.insert_one(simulation_doc)
+    await record_stats_safely(record_simulation_created(current_user['id']), 'simulation creation')
     
     return SimulationResponse(
         **simulation_doc,
@@ -811,12 +2477,17 @@ async def generate_simulation(criteria: SimulationGenerateRequest, current_user:
     )
 
 @api_router.get("/simulations/my", response_model=List[SimulationResponse])
-async def get_my_simulations(current_user: dict = Depends(get_current_user)):
-    """List user's simulations"""
-    simulations = await db.simulations.find(
-        {'created_by': current_user['id']},
-        {'_id': 0}
-    ).sort('created_at', -1).to_list(100)
+async def get_my_simulations(
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    """List user's simulations, newest first (next page in X-Next-Cursor)"""
+    simulations, next_cursor = await keyset_page(
+        db.simulations, {'created_by': current_user['id']}, {'_id': 0}, 'created_at', -1, page_size(limit, 100), cursor
+    )
+    response.headers.update(next_cursor_headers(next_cursor))
     
     return [SimulationResponse(**s, question_count=len(s.get('question_ids', []))) for s in simulations]
 
@@ -855,7 +2526,7 @@ async def get_simulation_questions(simulation_id: str, current_user: dict = Depe
     # Fetch questions without correct_answer
     questions = await db.questions.find(
         {'id': {'$in': question_ids}},
-        {'_id': 0, 'correct_answer': 0, 'question_hash': 0}
+        STUDENT_QUESTION_SHAPE.projection
     ).to_list(len(question_ids))
     
     # Maintain order
@@ -867,6 +2538,8 @@ async def get_simulation_questions(simulation_id: str, current_user: dict = Depe
             q['order'] = idx + 1
             ordered_questions.append(q)
     
+    if FAST_JSON_RESPONSES:
+        return json_bytes_response(encode_json([STUDENT_QUESTION_SHAPE.shape(q) for q in ordered_questions]))
     return [QuestionResponseStudent(**q) for q in ordered_questions]
 
 @api_router.post("/simulations/{simulation_id}/attempt", response_model=AttemptResponse)
@@ -897,14 +2570,398 @@ async def create_simulation_attempt(simulation_id: str, current_user: dict = Dep
         'status': 'in_progress',
         'answers': {},
         'score': None,
-        'duration_seconds': duration_seconds
+        'duration_seconds': duration_seconds,
+        # Valid answer targets, so save_answer can validate inside its update filter
+        'question_ids': simulation.get('question_ids', [])
     }
     
     await db.attempts.insert_one(attempt_doc)
+    await record_stats_safely(record_attempt_started(attempt_doc), 'attempt creation')
     return AttemptResponse(**attempt_doc)
 
+# ===== ANSWER WRITE-BEHIND =====
+
+class AnswerBuffer:
+    """Write-behind buffer for save_answer (ANSWER_WRITE_BEHIND).
+
+    An answer is acknowledged once appended to the current journal segment;
+    answers are coalesced per attempt and `flush()` writes each attempt as a
+    single $set. A full flush first seals the segment, and sealed segments are
+    deleted only after their answers are in MongoDB, so every acknowledged
+    answer is either in the database or in a segment on disk. Segments are
+    flock'ed while their process lives; `recover()` replays the unlocked ones
+    left behind by a crash.
+
+    Journaled answers carry a sequence number, assigned together with the
+    pending entry. A per-attempt flush marker records the last number issued
+    when the attempt's answers were taken, so replay drops only answers that
+    flush wrote and keeps ones saved while its write was in flight.
+
+    submit_attempt `close()`s an attempt before its final flush; `add()`
+    refuses answers for closed attempts, since they would miss the score and
+    be dropped by the write's in_progress filter after being acknowledged.
+    """
+
+    MAX_ATTEMPTS = 50000
+
+    def __init__(self, enabled: bool, journal_dir: Path, fsync: bool = False):
+        self.enabled = enabled
+        self.journal_dir = journal_dir
+        self.fsync = fsync
+        self._pending: Dict[str, Dict[str, str]] = {}  # attempt_id -> {question_id: letter}
+        self._journal = None
+        self._sealed: list = []  # open (still locked) segments awaiting a successful flush
+        self._flush_lock = asyncio.Lock()
+        self._seq = 0
+        # attempt_id -> (user_id, valid question ids), so buffered saves skip the attempt read
+        self._attempts: "OrderedDict[str, tuple]" = OrderedDict()
+        # Attempts being submitted or submitted through this process
+        self._closed: "OrderedDict[str, None]" = OrderedDict()
+        self.buffered = 0
+        self.flushes = 0
+        self.flushed_answers = 0
+        self.flush_errors = 0
+        self.recovered_answers = 0
+
+    # Validation cache
+
+    def accepts(self, attempt_id: str, user_id: str, question_id: str) -> bool:
+        entry = self._attempts.get(attempt_id)
+        if entry is None or entry[0] != user_id or question_id not in entry[1]:
+            return False
+        self._attempts.move_to_end(attempt_id)
+        return True
+
+    def remember(self, attempt_id: str, user_id: str, question_ids: Iterable[str]):
+        self._attempts[attempt_id] = (user_id, set(question_ids))
+        self._attempts.move_to_end(attempt_id)
+        while len(self._attempts) > self.MAX_ATTEMPTS:
+            self._attempts.popitem(last=False)
+
+    def forget(self, attempt_id: str):
+        self._attempts.pop(attempt_id, None)
+
+    def close(self, attempt_id: str):
+        self._closed[attempt_id] = None
+        self._closed.move_to_end(attempt_id)
+        while len(self._closed) > self.MAX_ATTEMPTS:
+            self._closed.popitem(last=False)
+
+    def reopen(self, attempt_id: str):
+        """Undo `close()` for a submit that left the attempt in progress"""
+        self._closed.pop(attempt_id, None)
+
+    def pending_for(self, attempt_id: str) -> Dict[str, str]:
+        return dict(self._pending.get(attempt_id, {}))
+
+    # Journal
+
+    def _open_segment(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        path = self.journal_dir / f"answers-{time.time_ns():020d}-{os.getpid()}.jsonl"
+        journal = open(path, 'a', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._journal = journal
+
+    async def _append(self, record: dict):
+        if self._journal is None:
+            self._open_segment()
+        self._journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            await asyncio.to_thread(os.fsync, self._journal.fileno())
+
+    def _seal(self):
+        if self._journal is not None:
+            self._sealed.append(self._journal)
+            self._journal = None
+
+    def _drop_sealed(self, segments: list):
+        for journal in segments:
+            journal.close()
+            Path(journal.name).unlink(missing_ok=True)
+            self._sealed.remove(journal)
+
+    # Buffering and flushing
+
+    def _next_seq(self) -> int:
+        # Wall-clock based so numbers keep increasing across a crash and restart
+        self._seq = max(self._seq + 1, time.time_ns())
+        return self._seq
+
+    async def add(self, attempt_id: str, question_id: str, letter: str) -> bool:
+        """Buffer and journal an answer; False (nothing buffered) once the attempt is closed"""
+        if attempt_id in self._closed:
+            return False
+        # Numbered and made pending in one step, so a flush marker's `upto`
+        # covers exactly the answers that flush took
+        seq = self._next_seq()
+        answers = self._pending.setdefault(attempt_id, {})
+        previous = answers.get(question_id)
+        answers[question_id] = letter
+        try:
+            await self._append({'a': attempt_id, 'q': question_id, 'v': letter, 's': seq})
+        except Exception:
+            # Not acknowledged: don't let a flush write it either
+            current = self._pending.get(attempt_id)
+            if current is not None and current.get(question_id) == letter:
+                if previous is None:
+                    current.pop(question_id, None)
+                else:
+                    current[question_id] = previous
+            raise
+        self.buffered += 1
+        return True
+
+    async def _write(self, pending: Dict[str, Dict[str, str]]):
+        # Completed attempts are skipped, exactly like a direct save after submit
+        operations = [
+            UpdateOne(
+                {'id': attempt_id, 'status': 'in_progress'},
+                {'$set': {f'answers.{question_id}': letter for question_id, letter in answers.items()}}
+            )
+            for attempt_id, answers in pending.items() if answers
+        ]
+        if operations:
+            await db.attempts.bulk_write(operations, ordered=False)
+        self.flushes += 1
+        self.flushed_answers += sum(len(answers) for answers in pending.values())
+
+    def _restore(self, pending: Dict[str, Dict[str, str]]):
+        """Put back answers whose write failed, without clobbering newer ones buffered meanwhile"""
+        for attempt_id, answers in pending.items():
+            current = self._pending.setdefault(attempt_id, {})
+            for question_id, letter in answers.items():
+                current.setdefault(question_id, letter)
+
+    async def flush(self, attempt_id: Optional[str] = None):
+        """Write buffered answers to MongoDB: one attempt (before submit) or everything"""
+        async with self._flush_lock:
+            if attempt_id is not None:
+                answers = self._pending.pop(attempt_id, None)
+                if not answers:
+                    return
+                upto = self._seq
+                pending = {attempt_id: answers}
+                sealed = []
+            else:
+                self._seal()
+                pending, self._pending = self._pending, {}
+                sealed = list(self._sealed)
+            try:
+                await self._write(pending)
+            except Exception:
+                self.flush_errors += 1
+                self._restore(pending)
+                raise
+            if attempt_id is not None:
+                # Replay must not re-apply these over answers written after the flush,
+                # nor drop answers added while the write was in flight (seq > upto)
+                await self._append({'a': attempt_id, 'flushed': True, 'upto': upto})
+            else:
+                self._drop_sealed(sealed)
+
+    async def recover(self):
+        """Adopt journal segments no live process holds and write their answers"""
+        if not self.journal_dir.exists():
+            return
+        # Segments replay oldest first; a flush marker may sit in a later segment than its answers
+        recovered: Dict[str, Dict[str, tuple]] = {}  # attempt_id -> {question_id: (seq, letter)}
+        for path in sorted(self.journal_dir.glob('answers-*.jsonl')):
+            journal = open(path, 'r+', encoding='utf-8')
+            if fcntl:
+                try:
+                    fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    journal.close()  # Owned by a running worker
+                    continue
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn final write from the crash; it was never acknowledged
+                if record.get('flushed'):
+                    upto = record.get('upto')
+                    answers = recovered.get(record['a'], {})
+                    for question_id in [q for q, (seq, _) in answers.items() if upto is None or seq <= upto]:
+                        del answers[question_id]
+                else:
+                    recovered.setdefault(record['a'], {})[record['q']] = (record.get('s', 0), record['v'])
+            self._sealed.append(journal)
+        replay = {
+            attempt_id: {question_id: letter for question_id, (_, letter) in answers.items()}
+            for attempt_id, answers in recovered.items() if answers
+        }
+        self.recovered_answers += sum(len(answers) for answers in replay.values())
+        self._restore(replay)
+        if self._sealed:
+            logger.info(f"Replaying {self.recovered_answers} journaled answers from {len(self._sealed)} segment(s)")
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'pending_attempts': len(self._pending),
+            'pending_answers': sum(len(answers) for answers in self._pending.values()),
+            'sealed_segments': len(self._sealed),
+            'cached_attempts': len(self._attempts),
+            'buffered': self.buffered,
+            'flushes': self.flushes,
+            'flushed_answers': self.flushed_answers,
+            'flush_errors': self.flush_errors,
+            'recovered_answers': self.recovered_answers
+        }
+
+answer_buffer = AnswerBuffer(ANSWER_WRITE_BEHIND, ANSWER_JOURNAL_DIR, ANSWER_JOURNAL_FSYNC)
+
+async def answer_buffer_flusher():
+    while True:
+        await asyncio.sleep(ANSWER_FLUSH_INTERVAL_SECONDS)
+        try:
+            await answer_buffer.flush()
+        except Exception as e:
+            logger.exception(f"Answer buffer flush failed: {e}")
+
+# ===== ATTEMPT REVIEWS =====
+#
+# A completed attempt's review is built once, right after submit, and stored
+# encoded in attempt_reviews, so viewing it is a single document read. The
+# snapshot shows the questions and key the attempt was graded against;
+# regrade deletes the snapshots of the attempts it rescans, and a missing
+# snapshot is rebuilt on the next view.
+
+# Question fields an attempt review reads
+REVIEW_QUESTION_PROJECTION = {
+    '_id': 0, 'id': 1, 'statement': 1, 'image_url': 1, 'alternatives': 1, 'correct_answer': 1,
+    'tags': 1, 'difficulty': 1, 'area': 1, 'subject': 1, 'topic': 1, 'education_level': 1,
+    'source_exam': 1, 'year': 1, 'explanation': 1
+}
+# The fields a cached student payload leaves out
+REVIEW_GRADING_PROJECTION = {'_id': 0, 'id': 1, 'correct_answer': 1, 'explanation': 1}
+REVIEW_ATTEMPT_PROJECTION = {
+    '_id': 0, 'id': 1, 'user_id': 1, 'status': 1, 'exam_id': 1, 'simulation_id': 1,
+    'question_ids': 1, 'answers': 1, 'user_answers': 1
+}
+
+def decode_json(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+async def review_questions(attempt: dict) -> List[dict]:
+    """Questions of an attempt in display order, resolved with one questions query"""
+    exam_id = attempt.get('exam_id')
+    if exam_id:
+        payload = await exam_payload_cache.get(exam_id)
+        if payload is not None:
+            # Published exam: statements and alternatives come from the cached
+            # student payload, only the key and explanations are read
+            grading = {q['id']: q async for q in db.questions.find({'exam_id': exam_id}, REVIEW_GRADING_PROJECTION)}
+            questions = [{**q, **grading[q['id']]} for q in decode_json(payload.body) if q['id'] in grading]
+        else:
+            questions = await db.questions.find(
+                {'exam_id': exam_id}, REVIEW_QUESTION_PROJECTION
+            ).sort('order', 1).to_list(None)
+        if questions:
+            return questions
+    
+    question_ids = attempt.get('question_ids')
+    if question_ids is None and attempt.get('simulation_id'):
+        # Attempts created before question_ids was stored on them
+        simulation = await db.simulations.find_one({'id': attempt['simulation_id']}, {'_id': 0, 'question_ids': 1})
+        question_ids = (simulation or {}).get('question_ids')
+    if not question_ids:
+        # Last resort: the questions that were answered
+        question_ids = list(attempt.get('answers') or attempt.get('user_answers') or {})
+    
+    questions = await db.questions.find(
+        {'id': {'$in': question_ids}}, REVIEW_QUESTION_PROJECTION
+    ).to_list(len(question_ids))
+    by_id = {q['id']: q for q in questions}
+    return [by_id[qid] for qid in question_ids if qid in by_id]
+
+async def build_attempt_review(attempt: dict) -> dict:
+    """AttemptReviewResponse of an attempt as a plain dict, in model field order"""
+    questions = await review_questions(attempt)
+    if not questions:
+        raise HTTPException(status_code=404, detail="Questions not found for this attempt")
+    
+    # Answers are stored as a dict on the attempt: {"<question_id>": "A"}
+    # Keep compatibility with older versions.
+    user_answers = attempt.get("answers") or attempt.get("user_answers") or {}
+    
+    review_items: List[dict] = []
+    correct_count = 0
+    for qdoc in questions:
+        qid = qdoc['id']
+        selected = user_answers.get(qid)
+        correct_answer = qdoc.get("correct_answer")
+        is_correct = bool(selected) and selected == correct_answer
+        if is_correct:
+            correct_count += 1
+        
+        review_items.append({
+            'question_id': qid,
+            'statement': qdoc.get("statement") or "",
+            'image_url': qdoc.get("image_url"),
+            'alternatives': [
+                {'letter': alt.get("letter"), 'text': alt.get("text")}
+                for alt in (qdoc.get("alternatives") or [])
+            ],
+            'correct_answer': correct_answer,
+            'selected_answer': selected,
+            'is_correct': is_correct,
+            'tags': qdoc.get("tags") or [],
+            'difficulty': qdoc.get("difficulty") or "medium",
+            'area': qdoc.get("area") or "string",
+            'subject': qdoc.get("subject") or "string",
+            'topic': qdoc.get("topic") or "string",
+            'education_level': qdoc.get("education_level") or "vestibular",
+            'source_exam': qdoc.get("source_exam") or "string",
+            'year': qdoc.get("year") or 0,
+            'explanation': qdoc.get("explanation")
+        })
+    
+    total_questions = len(review_items)
+    return {
+        'attempt_id': attempt['id'],
+        'exam_id': attempt.get("exam_id") or attempt.get("simulation_id") or "",
+        'score': (correct_count / total_questions) * 100 if total_questions else 0.0,
+        'correct_count': correct_count,
+        'total_questions': total_questions,
+        'questions': review_items
+    }
+
+def encode_review(review: dict) -> bytes:
+    if FAST_JSON_RESPONSES:
+        return encode_json(review)
+    return AttemptReviewResponse(**review).model_dump_json().encode('utf-8')
+
+async def store_attempt_review(attempt: dict) -> bytes:
+    """Build, encode and snapshot the review of a completed attempt"""
+    body = encode_review(await build_attempt_review(attempt))
+    await db.attempt_reviews.update_one(
+        {'attempt_id': attempt['id']},
+        {'$set': {
+            'user_id': attempt['user_id'],
+            'body': body,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+    return body
+
+async def snapshot_attempt_review(attempt: dict):
+    try:
+        await store_attempt_review(attempt)
+    except Exception as e:
+        # Not fatal: the review is built and stored on its first view instead
+        logger.warning(f"Review snapshot for attempt {attempt['id']} failed: {e}")
+
 # ===== ATTEMPT ROUTES =====
 
+# Attempts carry their valid question_ids for save_answer; responses never need them
+ATTEMPT_PUBLIC_PROJECTION = {'_id': 0, 'question_ids': 0, 'answer_seq': 0}
+
 @api_router.post("/attempts", response_model=AttemptResponse)
 async def create_attempt(attempt_data: AttemptCreate, current_user: dict = Depends(get_current_user)):
     if not attempt_data.exam_id:
@@ -916,6 +2973,9 @@ async def create_attempt(attempt_data: AttemptCreate, current_user: dict = Depen
     
     attempt_id = str(uuid.uuid4())
     duration_seconds = exam.get('duration_minutes', 60) * 60
+    question_ids = [
+        q['id'] async for q in db.questions.find({'exam_id': attempt_data.exam_id}, {'_id': 0, 'id': 1})
+    ]
     
     attempt_doc = {
         'id': attempt_id,
@@ -929,180 +2989,278 @@ async def create_attempt(attempt_data: AttemptCreate, current_user: dict = Depen
         'status': 'in_progress',
         'answers': {},
         'score': None,
-        'duration_seconds': duration_seconds
+        'duration_seconds': duration_seconds,
+        # Valid answer targets, so save_answer can validate inside its update filter
+        'question_ids': question_ids
     }
     
     await db.attempts.insert_one(attempt_doc)
+    await record_stats_safely(record_attempt_started(attempt_doc), 'attempt creation')
     return AttemptResponse(**attempt_doc)
 
 @api_router.get("/attempts/{attempt_id}", response_model=AttemptResponse)
 async def get_attempt(attempt_id: str, current_user: dict = Depends(get_current_user)):
-    attempt = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']}, {'_id': 0})
+    attempt = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']}, ATTEMPT_PUBLIC_PROJECTION)
     if not attempt:
         raise HTTPException(status_code=404, detail='Attempt not found')
     
+    if attempt['status'] == 'in_progress' and answer_buffer.enabled:
+        # Show answers still waiting in this worker's write-behind buffer
+        attempt['answers'] = {**attempt.get('answers', {}), **answer_buffer.pending_for(attempt_id)}
+    
     return AttemptResponse(**attempt)
 
 
 
 @api_router.get("/attempts/{attempt_id}/review", response_model=AttemptReviewResponse)
-async def get_attempt_review(attempt_id: str, current_user=Depends(get_current_user)):
-    attempt_doc = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']})
-    if not attempt_doc:
-        raise HTTPException(status_code=404, detail="Attempt not found")
-
-    # Attempt may be from an exam OR a personalized simulation
-    exam_id = attempt_doc.get("exam_id")
-    simulation_id = attempt_doc.get("simulation_id")
-    # Answers are stored as a dict on the attempt: {"<question_id>": "A"}
-    # Keep compatibility with older versions.
-    user_answers = attempt_doc.get("answers") or attempt_doc.get("user_answers") or {}
-
-    # Normalize keys to strings to avoid mismatches (Mongo IDs may be int).
-    user_answers = {str(k): v for k, v in user_answers.items()}
-
-    question_ids: List[str] = []
-
-    # Prefer querying questions by exam_id (most common schema).
-    q_docs: List[dict] = []
-    question_ids = []
-
-    if exam_id:
-        q_docs = await db.questions.find({'exam_id': exam_id}).to_list(length=None)
-
-        # Fallback to exam.question_ids ordering if questions don't have exam_id
-        if not q_docs:
-            exam = await db.exams.find_one({'id': exam_id})
-            if exam:
-                question_ids = exam.get("question_ids") or []
-
-    elif simulation_id:
-        simulation = await db.simulations.find_one({'id': simulation_id, 'user_id': current_user['id']})
-        if simulation:
-            question_ids = simulation.get("question_ids") or []
-
-    # Last resort: infer question_ids from stored answers
-    if not question_ids and not q_docs:
-        question_ids = list(user_answers.keys())
-
-    if question_ids and not q_docs:
-        norm_qids = []
-        for qid in question_ids:
-            try:
-                norm_qids.append(int(qid))
-            except Exception:
-                norm_qids.append(qid)
-        q_docs = await db.questions.find({'id': {'$in': norm_qids}}).to_list(length=len(norm_qids))
-
-    if not q_docs:
-        raise HTTPException(status_code=404, detail="Questions not found for this attempt")
-
-    # Build index by stringified question id for consistent lookups
-    q_by_id = {str(q.get('id')): q for q in q_docs}
-
-    # If we didn't get an explicit ordering, use the DB order
-    if not question_ids:
-        question_ids = [str(q.get('id')) for q in q_docs]
+async def get_attempt_review(attempt_id: str, request: Request, current_user=Depends(get_current_user)):
+    # OPTIMIZED: completed attempts are served from their stored snapshot, one document read
+    snapshot = await db.attempt_reviews.find_one(
+        {'attempt_id': attempt_id, 'user_id': current_user['id']},
+        {'_id': 0, 'body': 1}
+    )
+    if snapshot:
+        body = snapshot['body']
     else:
-        question_ids = [str(qid) for qid in question_ids]
-
-    review_items: List[AttemptReviewItem] = []
-    correct_count = 0
+        attempt = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']}, REVIEW_ATTEMPT_PROJECTION)
+        if not attempt:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if attempt.get('status') == 'completed':
+            body = await store_attempt_review(attempt)
+        else:
+            body = encode_review(await build_attempt_review(attempt))
+    # Reviews run to hundreds of KB of text; compress them per request
+    return await compressed_json_response(request, body)
 
-    # Preserve original order (exam/simulation order)
-    for qid in question_ids:
-        qdoc = q_by_id.get(qid)
-        if not qdoc:
-            continue
 
-        selected = user_answers.get(qid)
-        correct_answer = qdoc.get("correct_answer")
-        is_correct = bool(selected) and selected == correct_answer
-        if is_correct:
-            correct_count += 1
+async def question_belongs_to_attempt(attempt: dict, question_id: str) -> bool:
+    """Membership check against the exam/simulation itself, for attempts whose stored list can't answer it"""
+    if attempt.get('exam_id'):
+        question = await db.questions.find_one(
+            {'id': question_id, 'exam_id': attempt['exam_id']},
+            {'_id': 0, 'id': 1}
+        )
+        return question is not None
+    if attempt.get('simulation_id'):
+        simulation = await db.simulations.find_one({'id': attempt['simulation_id']}, {'_id': 0, 'question_ids': 1})
+        return bool(simulation) and question_id in simulation.get('question_ids', [])
+    return False
 
-        # Normalize alternatives to Alternative model
-        alternatives = []
-        for alt in (qdoc.get("alternatives") or []):
-            if isinstance(alt, dict):
-                alternatives.append(Alternative(letter=alt.get("letter"), text=alt.get("text")))
-            else:
-                # already Alternative
-                alternatives.append(alt)
-
-        review_items.append(AttemptReviewItem(
-            question_id=qid,
-            statement=qdoc.get("statement") or "",
-            image_url=qdoc.get("image_url"),
-            alternatives=alternatives,
-            correct_answer=correct_answer,
-            selected_answer=selected,
-            is_correct=is_correct,
-            tags=qdoc.get("tags") or [],
-            difficulty=qdoc.get("difficulty") or "medium",
-            area=qdoc.get("area") or "string",
-            subject=qdoc.get("subject") or "string",
-            topic=qdoc.get("topic") or "string",
-            education_level=qdoc.get("education_level") or "vestibular",
-            source_exam=qdoc.get("source_exam") or "string",
-            year=qdoc.get("year") or 0,
-            explanation=qdoc.get("explanation")
-        ))
+async def save_answer_slow_path(attempt_id: str, answer_data: AnswerSubmit, current_user: dict):
+    """Explain why the conditional save matched nothing, or save for attempts without a usable question list.
 
-    total_questions = len(review_items)
-    score = (correct_count / total_questions) * 100 if total_questions else 0
-
-    return AttemptReviewResponse(
-        attempt_id=attempt_id,
-        exam_id=exam_id or simulation_id or "",
-        total_questions=total_questions,
-        correct_count=correct_count,
-        score=score,
-        questions=review_items
+    Attempts created before question_ids was stored, and exam questions added
+    after the attempt started, are validated the old way and saved here.
+    """
+    attempt = await db.attempts.find_one(
+        {'id': attempt_id, 'user_id': current_user['id']},
+        {'_id': 0, 'status': 1, 'exam_id': 1, 'simulation_id': 1, 'question_ids': 1}
     )
+    if not attempt:
+        raise HTTPException(status_code=404, detail='Attempt not found')
+    
+    if attempt['status'] != 'in_progress':
+        raise HTTPException(status_code=400, detail='Attempt already completed')
+    
+    if not await question_belongs_to_attempt(attempt, answer_data.question_id):
+        raise HTTPException(status_code=400, detail='Invalid question_id for this attempt')
+    
+    update = {'$set': {f'answers.{answer_data.question_id}': answer_data.selected_answer}}
+    if 'question_ids' in attempt:
+        # Late exam question: remember it so the next save takes the fast path
+        update['$addToSet'] = {'question_ids': answer_data.question_id}
+    result = await db.attempts.update_one({'id': attempt_id, 'status': 'in_progress'}, update)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=400, detail='Attempt already completed')
 
-
-
-@api_router.post("/attempts/{attempt_id}/answer")
-async def save_answer(attempt_id: str, answer_data: AnswerSubmit, current_user: dict = Depends(get_current_user)):
-    attempt = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']}, {'_id': 0})
+async def admit_buffered_answer(attempt_id: str, question_id: str, current_user: dict):
+    """Validate an attempt for write-behind saves once, then cache its question ids"""
+    attempt = await db.attempts.find_one(
+        {'id': attempt_id, 'user_id': current_user['id']},
+        {'_id': 0, 'id': 1, 'status': 1, 'exam_id': 1, 'simulation_id': 1, 'question_ids': 1}
+    )
     if not attempt:
         raise HTTPException(status_code=404, detail='Attempt not found')
     
     if attempt['status'] != 'in_progress':
         raise HTTPException(status_code=400, detail='Attempt already completed')
     
+    question_ids = attempt.get('question_ids')
+    if question_ids is None:
+        question_ids = await backfill_attempt_question_ids(attempt)
+    question_ids = set(question_ids)
+    if question_id not in question_ids:
+        if not await question_belongs_to_attempt(attempt, question_id):
+            raise HTTPException(status_code=400, detail='Invalid question_id for this attempt')
+        question_ids.add(question_id)
+    answer_buffer.remember(attempt_id, current_user['id'], question_ids)
+
+@api_router.post("/attempts/{attempt_id}/answer")
+async def save_answer(attempt_id: str, answer_data: AnswerSubmit, current_user: dict = Depends(get_current_user)):
     # VALIDATION: Ensure selected_answer is valid (A-E)
-    if answer_data.selected_answer not in ['A', 'B', 'C', 'D', 'E']:
+    if answer_data.selected_answer not in VALID_ANSWERS:
         raise HTTPException(status_code=400, detail='Invalid answer. Must be A, B, C, D, or E')
     
-    # VALIDATION: Verify question_id belongs to this attempt's exam/simulation
+    if answer_buffer.enabled:
+        if not answer_buffer.accepts(attempt_id, current_user['id'], answer_data.question_id):
+            await admit_buffered_answer(attempt_id, answer_data.question_id, current_user)
+        if not await answer_buffer.add(attempt_id, answer_data.question_id, answer_data.selected_answer):
+            raise HTTPException(status_code=400, detail='Attempt already completed')
+        return {'message': 'Answer saved'}
+    
+    # Hot path: ownership, status and question membership are all checked by the
+    # update filter against the question_ids stored on the attempt, in one round-trip
+    result = await db.attempts.update_one(
+        {
+            'id': attempt_id,
+            'user_id': current_user['id'],
+            'status': 'in_progress',
+            'question_ids': answer_data.question_id
+        },
+        {'$set': {f'answers.{answer_data.question_id}': answer_data.selected_answer}}
+    )
+    if result.matched_count == 0:
+        await save_answer_slow_path(attempt_id, answer_data, current_user)
+    
+    return {'message': 'Answer saved'}
+
+def latest_answers(items: List[AnswerBatchItem]) -> Dict[str, AnswerBatchItem]:
+    """Last-writer-wins per question: highest seq, then latest client_ts, then position in the batch"""
+    def version(item: AnswerBatchItem):
+        return (item.seq, item.client_ts.timestamp() if item.client_ts else 0.0)
+    
+    winners: Dict[str, AnswerBatchItem] = {}
+    for item in items:
+        current = winners.get(item.question_id)
+        if current is None or version(item) >= version(current):
+            winners[item.question_id] = item
+    return winners
+
+def usable_field_name(key: str) -> bool:
+    """Whether a client-supplied id can be a MongoDB field name (no '.', no leading '$')"""
+    return bool(key) and '.' not in key and not key.startswith('$')
+
+def answer_batch_pipeline(winners: Dict[str, AnswerBatchItem]) -> List[dict]:
+    """Update pipeline writing each answer only if its question belongs to the attempt and its seq is newer"""
+    fields = {}
+    for question_id, item in winners.items():
+        newer = {'$and': [
+            {'$in': [question_id, '$question_ids']},
+            {'$gt': [item.seq, {'$ifNull': [f'$answer_seq.{question_id}', -1]}]}
+        ]}
+        fields[f'answers.{question_id}'] = {'$cond': [newer, item.selected_answer, f'$answers.{question_id}']}
+        fields[f'answer_seq.{question_id}'] = {'$cond': [newer, item.seq, f'$answer_seq.{question_id}']}
+    return [{'$set': fields}]
+
+async def backfill_attempt_question_ids(attempt: dict) -> List[str]:
+    """Store the current question list on an attempt (legacy attempts, exam questions added later)"""
     if attempt.get('exam_id'):
-        question = await db.questions.find_one(
-            {'id': answer_data.question_id, 'exam_id': attempt['exam_id']},
-            {'_id': 0, 'id': 1}
-        )
+        question_ids = [q['id'] async for q in db.questions.find({'exam_id': attempt['exam_id']}, {'_id': 0, 'id': 1})]
     elif attempt.get('simulation_id'):
         simulation = await db.simulations.find_one({'id': attempt['simulation_id']}, {'_id': 0, 'question_ids': 1})
-        if simulation and answer_data.question_id in simulation.get('question_ids', []):
-            question = {'id': answer_data.question_id}
-        else:
-            question = None
+        question_ids = (simulation or {}).get('question_ids', [])
     else:
-        question = None
+        question_ids = []
+    await db.attempts.update_one({'id': attempt['id']}, {'$addToSet': {'question_ids': {'$each': question_ids}}})
+    return question_ids
+
+@api_router.post("/attempts/{attempt_id}/answers")
+async def save_answers(attempt_id: str, batch: AnswerBatchSubmit, current_user: dict = Depends(get_current_user)):
+    """Save a client's queued answers in one write.
+
+    Per question the entry with the highest seq wins, both inside the batch and
+    against answers saved by earlier batches, so replayed or out-of-order
+    flushes never overwrite a newer answer. Answers sent through the single
+    /answer endpoint carry no seq and are overwritten by any batch entry.
+    """
+    invalid_letters = sorted({item.question_id for item in batch.answers if item.selected_answer not in VALID_ANSWERS})
+    if invalid_letters:
+        raise HTTPException(status_code=400, detail=f'Invalid answer for questions {invalid_letters}. Must be A, B, C, D, or E')
     
-    if not question:
-        raise HTTPException(status_code=400, detail='Invalid question_id for this attempt')
+    if answer_buffer.enabled:
+        # Buffered single saves are older than this batch; land them first
+        await answer_buffer.flush(attempt_id)
     
-    await db.attempts.update_one(
-        {'id': attempt_id},
-        {'$set': {f'answers.{answer_data.question_id}': answer_data.selected_answer}}
+    winners = latest_answers(batch.answers)
+    # Ids that can't be field names can't be questions either; keep them out of the update paths
+    unusable = [qid for qid in winners if not usable_field_name(qid)]
+    for qid in unusable:
+        del winners[qid]
+    if not winners:
+        attempt = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']}, {'_id': 0, 'status': 1})
+        if not attempt:
+            raise HTTPException(status_code=404, detail='Attempt not found')
+        if attempt['status'] != 'in_progress':
+            raise HTTPException(status_code=400, detail='Attempt already completed')
+        return {'saved': [], 'stale': [], 'invalid': unusable}
+    owner_filter = {'id': attempt_id, 'user_id': current_user['id'], 'status': 'in_progress'}
+    projection = {'_id': 0, 'id': 1, 'exam_id': 1, 'simulation_id': 1}
+    projection.update({f'answer_seq.{qid}': 1 for qid in winners})
+    
+    attempt = await db.attempts.find_one_and_update(
+        {**owner_filter, 'question_ids': {'$exists': True}},
+        answer_batch_pipeline(winners),
+        projection=projection,
+        return_document=ReturnDocument.AFTER
     )
+    if attempt is None:
+        attempt = await db.attempts.find_one(
+            {'id': attempt_id, 'user_id': current_user['id']},
+            {'_id': 0, 'id': 1, 'status': 1, 'exam_id': 1, 'simulation_id': 1}
+        )
+        if not attempt:
+            raise HTTPException(status_code=404, detail='Attempt not found')
+        if attempt['status'] != 'in_progress':
+            raise HTTPException(status_code=400, detail='Attempt already completed')
+        # Attempt predates stored question lists
+        await backfill_attempt_question_ids(attempt)
+        attempt = await db.attempts.find_one_and_update(
+            owner_filter, answer_batch_pipeline(winners),
+            projection=projection, return_document=ReturnDocument.AFTER
+        )
+    elif attempt.get('exam_id') and any(qid not in attempt.get('answer_seq', {}) for qid in winners):
+        # Unknown ids may be exam questions added after the attempt started
+        await backfill_attempt_question_ids(attempt)
+        attempt = await db.attempts.find_one_and_update(
+            owner_filter, answer_batch_pipeline(winners),
+            projection=projection, return_document=ReturnDocument.AFTER
+        )
+    if attempt is None:
+        raise HTTPException(status_code=400, detail='Attempt already completed')
     
-    return {'message': 'Answer saved'}
+    stored = attempt.get('answer_seq', {})
+    saved, stale, invalid = [], [], list(unusable)
+    for question_id, item in winners.items():
+        if question_id not in stored:
+            invalid.append(question_id)
+        elif stored[question_id] == item.seq:
+            saved.append(question_id)
+        else:
+            stale.append(question_id)
+    
+    return {'saved': saved, 'stale': stale, 'invalid': invalid}
 
 @api_router.post("/attempts/{attempt_id}/submit", response_model=AttemptResponse)
 async def submit_attempt(attempt_id: str, current_user: dict = Depends(get_current_user)):
+    if not answer_buffer.enabled:
+        return await complete_attempt(attempt_id, current_user)
+    
+    # Answers buffered after the flush would be acknowledged, then miss the
+    # score and the in_progress write filter: refuse them from here on
+    answer_buffer.close(attempt_id)
+    try:
+        # Every acknowledged answer must be in the document before it is scored
+        await answer_buffer.flush(attempt_id)
+        return await complete_attempt(attempt_id, current_user)
+    except HTTPException as e:
+        if e.detail != 'Attempt already completed':
+            answer_buffer.reopen(attempt_id)
+        raise
+    except BaseException:
+        answer_buffer.reopen(attempt_id)
+        raise
+
+async def complete_attempt(attempt_id: str, current_user: dict) -> AttemptResponse:
     attempt = await db.attempts.find_one({'id': attempt_id, 'user_id': current_user['id']}, {'_id': 0})
     if not attempt:
         raise HTTPException(status_code=404, detail='Attempt not found')
@@ -1110,85 +3268,484 @@ async def submit_attempt(attempt_id: str, current_user: dict = Depends(get_curre
     if attempt['status'] != 'in_progress':
         raise HTTPException(status_code=400, detail='Attempt already completed')
     
-    # Get questions based on exam_id or simulation_id
+    # Only the answer key is needed to score: (id, correct letter, area, subject)
     if attempt.get('exam_id'):
-        questions = await db.questions.find({'exam_id': attempt['exam_id']}, {'_id': 0}).to_list(500)
+        answer_key = await answer_key_cache.get(attempt['exam_id'])
     elif attempt.get('simulation_id'):
-        simulation = await db.simulations.find_one({'id': attempt['simulation_id']}, {'_id': 0})
-        if not simulation:
-            raise HTTPException(status_code=404, detail='Simulation not found')
-        question_ids = simulation.get('question_ids', [])
-        questions = await db.questions.find({'id': {'$in': question_ids}}, {'_id': 0}).to_list(len(question_ids))
+        # Simulations are immutable, so the list stored on the attempt is authoritative
+        question_ids = attempt.get('question_ids')
+        if question_ids is None:
+            simulation = await db.simulations.find_one({'id': attempt['simulation_id']}, {'_id': 0, 'question_ids': 1})
+            if not simulation:
+                raise HTTPException(status_code=404, detail='Simulation not found')
+            question_ids = simulation.get('question_ids', [])
+        answer_key = await load_answer_key({'id': {'$in': question_ids}}, len(question_ids))
     else:
         raise HTTPException(status_code=400, detail='Invalid attempt: no exam or simulation')
     
-    # Calculate score
-    total_correct = 0
-    area_scores = {}
-    subject_scores = {}
-    
-    for question in questions:
-        area = question.get('area') or question.get('subject') or 'Geral'
-        subject = question.get('subject') or area
-        
-        if area not in area_scores:
-            area_scores[area] = {'correct': 0, 'total': 0}
-        if subject not in subject_scores:
-            subject_scores[subject] = {'correct': 0, 'total': 0}
-        
-        area_scores[area]['total'] += 1
-        subject_scores[subject]['total'] += 1
-        
-        selected = attempt['answers'].get(question['id'])
-        if selected == question['correct_answer']:
-            total_correct += 1
-            area_scores[area]['correct'] += 1
-            subject_scores[subject]['correct'] += 1
-    
-    # Calculate percentages
-    for area in area_scores:
-        area_scores[area]['percentage'] = round(
-            (area_scores[area]['correct'] / area_scores[area]['total']) * 100, 2
-        ) if area_scores[area]['total'] > 0 else 0
-    
-    for subject in subject_scores:
-        subject_scores[subject]['percentage'] = round(
-            (subject_scores[subject]['correct'] / subject_scores[subject]['total']) * 100, 2
-        ) if subject_scores[subject]['total'] > 0 else 0
-    
-    score_data = {
-        'total_correct': total_correct,
-        'total_questions': len(questions),
-        'percentage': round((total_correct / len(questions)) * 100, 2) if len(questions) > 0 else 0,
-        'by_area': area_scores,
-        'by_subject': subject_scores
-    }
+    score_data = answer_key.score(attempt['answers'])
     
-    await db.attempts.update_one(
-        {'id': attempt_id},
+    # Conditional on in_progress so a concurrent double submit is only counted once
+    result = await db.attempts.update_one(
+        {'id': attempt_id, 'status': 'in_progress'},
         {'$set': {
             'status': 'completed',
             'end_time': datetime.now(timezone.utc).isoformat(),
             'score': score_data
         }}
     )
+    answer_buffer.forget(attempt_id)
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail='Attempt already completed')
     
-    attempt = await db.attempts.find_one({'id': attempt_id}, {'_id': 0})
-    return AttemptResponse(**attempt)
+    completed = await db.attempts.find_one({'id': attempt_id}, ATTEMPT_PUBLIC_PROJECTION)
+    await record_stats_safely(record_attempt_completed(completed), 'submit')
+    # Snapshot the review off the request path; the first view builds it if this hasn't finished
+    spawn_background(snapshot_attempt_review(attempt))
+    return AttemptResponse(**completed)
 
 @api_router.get("/attempts", response_model=List[AttemptResponse])
 async def get_user_attempts(
+    response: Response,
     current_user: dict = Depends(get_current_user),
     limit: int = 50,
-    skip: int = 0
+    skip: int = 0,
+    cursor: Optional[str] = None
 ):
-    # OPTIMIZED: Added pagination with reasonable defaults
-    attempts = await db.attempts.find(
-        {'user_id': current_user['id']}, 
-        {'_id': 0}
-    ).sort('start_time', -1).skip(skip).limit(min(limit, 100)).to_list(min(limit, 100))
+    # OPTIMIZED: keyset pages on (user_id, start_time, id); skip is kept for older clients
+    attempts, next_cursor = await keyset_page(
+        db.attempts, {'user_id': current_user['id']}, ATTEMPT_PUBLIC_PROJECTION,
+        'start_time', -1, page_size(limit, 100), cursor, skip=max(skip, 0)
+    )
+    response.headers.update(next_cursor_headers(next_cursor))
     return [AttemptResponse(**attempt) for attempt in attempts]
 
+# ===== REGRADE =====
+
+REGRADE_ATTEMPT_PROJECTION = {
+    '_id': 0, 'id': 1, 'user_id': 1, 'exam_id': 1, 'simulation_id': 1, 'end_time': 1, 'answers': 1, 'score': 1
+}
+
+async def regrade_scope(exam_id: Optional[str], question_ids: Optional[List[str]]) -> Optional[dict]:
+    """Filter for completed attempts affected by an exam or by specific questions (None if nothing is)"""
+    exam_ids = {exam_id} if exam_id else set()
+    scopes = []
+    if question_ids:
+        async for q in db.questions.find({'id': {'$in': question_ids}}, {'_id': 0, 'exam_id': 1}):
+            if q.get('exam_id'):
+                exam_ids.add(q['exam_id'])
+        simulation_ids = [
+            sim['id'] async for sim in db.simulations.find({'question_ids': {'$in': question_ids}}, {'_id': 0, 'id': 1})
+        ]
+        if simulation_ids:
+            scopes.append({'simulation_id': {'$in': simulation_ids}})
+    if exam_ids:
+        scopes.append({'exam_id': {'$in': list(exam_ids)}})
+    if not scopes:
+        return None
+    return {'status': 'completed', '$or': scopes}
+
+async def regrade_batch(attempts: List[dict], exam_keys: Dict[str, AnswerKey]) -> List[tuple]:
+    """Rescore a batch of attempts; returns (attempt, new score) for those whose score changed"""
+    groups: Dict[tuple, List[dict]] = {}
+    for attempt in attempts:
+        source = ('exam', attempt['exam_id']) if attempt.get('exam_id') else ('simulation', attempt.get('simulation_id'))
+        groups.setdefault(source, []).append(attempt)
+    
+    # One query for the question lists of every simulation in the batch, one for their keys
+    simulation_ids = [sid for kind, sid in groups if kind == 'simulation' and sid]
+    simulation_questions = {}
+    entries_by_id = {}
+    if simulation_ids:
+        async for sim in db.simulations.find({'id': {'$in': simulation_ids}}, {'_id': 0, 'id': 1, 'question_ids': 1}):
+            simulation_questions[sim['id']] = sim.get('question_ids', [])
+        all_ids = list({qid for qids in simulation_questions.values() for qid in qids})
+        async for q in db.questions.find({'id': {'$in': all_ids}}, ANSWER_KEY_PROJECTION):
+            entries_by_id[q['id']] = answer_key_entry(q)
+    
+    changed = []
+    for (kind, source_id), group in groups.items():
+        if kind == 'exam':
+            if source_id not in exam_keys:
+                exam_keys[source_id] = await load_answer_key({'exam_id': source_id}, 500)
+            key = exam_keys[source_id]
+        else:
+            if source_id not in simulation_questions:
+                continue
+            key = AnswerKey([entries_by_id[qid] for qid in simulation_questions[source_id] if qid in entries_by_id])
+        for attempt, score in zip(group, key.score_many([a.get('answers') or {} for a in group])):
+            if score != attempt.get('score'):
+                changed.append((attempt, score))
+    return changed
+
+async def regrade_attempts(
+    exam_id: Optional[str] = None,
+    question_ids: Optional[List[str]] = None,
+    dry_run: bool = False,
+    batch_size: int = 1000
+) -> dict:
+    """Rescore completed attempts after an answer-key change.
+
+    Streams the affected attempts with a cursor, scores each batch with the
+    vectorized AnswerKey engine and writes only changed scores back with one
+    bulk_write per batch, so memory is bounded by `batch_size` attempts.
+    With `dry_run` nothing is written.
+    """
+    started = time.monotonic()
+    report = {'scanned': 0, 'changed': 0, 'written': 0, 'batches': 0, 'dry_run': dry_run}
+    query = await regrade_scope(exam_id, question_ids)
+    exam_keys: Dict[str, AnswerKey] = {}
+    
+    async def process(batch: List[dict]):
+        changed = await regrade_batch(batch, exam_keys)
+        report['batches'] += 1
+        report['scanned'] += len(batch)
+        report['changed'] += len(changed)
+        if not dry_run:
+            # Reviews show the key; rebuild them even where the score didn't move
+            await db.attempt_reviews.delete_many({'attempt_id': {'$in': [attempt['id'] for attempt in batch]}})
+        if changed and not dry_run:
+            regraded_at = datetime.now(timezone.utc).isoformat()
+            result = await db.attempts.bulk_write([
+                UpdateOne({'id': attempt['id']}, {'$set': {'score': score, 'regraded_at': regraded_at}})
+                for attempt, score in changed
+            ], ordered=False)
+            report['written'] += result.modified_count
+            await db.user_stats.bulk_write(regrade_stats_updates(changed), ordered=False)
+            trends = [
+                update
+                for attempt, score in changed if attempt.get('end_time')
+                for update in (
+                    # Deltas only: a missing bucket is rebuilt whole from attempts, never from a delta
+                    trend_updates(attempt, (attempt.get('score') or {}).get('by_subject'), sign=-1, attempts=-1, upsert=False)
+                    + trend_updates(attempt, score.get('by_subject'), upsert=False)
+                )
+            ]
+            if trends:
+                await db.user_subject_trends.bulk_write(trends, ordered=False)
+    
+    if query is not None:
+        batch: List[dict] = []
+        async for attempt in db.attempts.find(query, REGRADE_ATTEMPT_PROJECTION).batch_size(batch_size):
+            batch.append(attempt)
+            if len(batch) >= batch_size:
+                await process(batch)
+                batch = []
+        if batch:
+            await process(batch)
+    
+    elapsed = time.monotonic() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['attempts_per_second'] = round(report['scanned'] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+@api_router.post("/admin/regrade")
+async def regrade(request: RegradeRequest, current_user: dict = Depends(get_current_user)):
+    """Rescore completed attempts for an exam and/or specific questions"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    if not request.exam_id and not request.question_ids:
+        raise HTTPException(status_code=400, detail='exam_id or question_ids is required')
+    
+    return await regrade_attempts(
+        exam_id=request.exam_id,
+        question_ids=request.question_ids,
+        dry_run=request.dry_run,
+        batch_size=request.batch_size
+    )
+
+# ===== QUESTION STATS =====
+#
+# `question_stats` holds one document per question with raw counts taken from
+# completed attempts: times shown, blanks, and per letter how often it was
+# chosen plus the sum of those students' attempt percentages. The p-value is
+# computed when read, against the question's current correct_answer, so key
+# changes need no reprocessing.
+#
+# refresh_question_stats() streams attempts completed after the watermark in
+# (end_time, id) order, one batch at a time, under a lease so only one run is
+# active. Each question's counters also carry the key of the last attempt
+# folded into them, and older attempts are skipped for that question, so a
+# batch replayed after a crash between the counter writes and the watermark
+# update is not counted twice.
+
+QUESTION_STATS_STATE_ID = 'question_stats'
+QUESTION_STATS_LEASE_SECONDS = 300  # Renewed after every batch
+QUESTION_STATS_ATTEMPT_PROJECTION = {'_id': 0, 'id': 1, 'end_time': 1, 'question_ids': 1, 'answers': 1, 'score.percentage': 1}
+
+def attempt_stats_key(attempt: dict) -> str:
+    """Position of a completed attempt in the pipeline's (end_time, id) order"""
+    return f"{attempt['end_time']}|{attempt['id']}"
+
+def question_stats_increments(attempts: List[dict], watermarks: Dict[str, str]) -> Dict[str, dict]:
+    """Per-question $inc documents for one batch, skipping attempts a question already holds"""
+    increments: Dict[str, dict] = {}
+    for attempt in attempts:
+        key = attempt_stats_key(attempt)
+        answers = attempt.get('answers') or {}
+        percentage = (attempt.get('score') or {}).get('percentage', 0)
+        shown = attempt.get('question_ids') or answers.keys()
+        for question_id in shown:
+            if key <= watermarks.get(question_id, ''):
+                continue
+            inc = increments.setdefault(question_id, {'shown': 0})
+            inc['shown'] += 1
+            letter = answers.get(question_id)
+            if letter in ANSWER_LETTER_CODES:
+                inc[f'choices.{letter}'] = inc.get(f'choices.{letter}', 0) + 1
+                inc[f'choice_score_sums.{letter}'] = inc.get(f'choice_score_sums.{letter}', 0) + percentage
+            else:
+                inc['blank'] = inc.get('blank', 0) + 1
+    return increments
+
+async def apply_question_stats_batch(attempts: List[dict]) -> tuple:
+    """Fold one batch into question_stats; returns (answers counted, questions updated)"""
+    question_ids = {
+        question_id
+        for attempt in attempts
+        for question_id in (attempt.get('question_ids') or (attempt.get('answers') or {}).keys())
+    }
+    watermarks = {
+        stats['question_id']: stats.get('watermark', '')
+        async for stats in db.question_stats.find(
+            {'question_id': {'$in': list(question_ids)}}, {'_id': 0, 'question_id': 1, 'watermark': 1}
+        )
+    }
+    increments = question_stats_increments(attempts, watermarks)
+    if not increments:
+        return 0, 0
+    
+    batch_key = attempt_stats_key(attempts[-1])
+    now = datetime.now(timezone.utc).isoformat()
+    await db.question_stats.bulk_write([
+        UpdateOne(
+            {'question_id': question_id},
+            {'$inc': inc, '$max': {'watermark': batch_key}, '$set': {'updated_at': now}},
+            upsert=True
+        )
+        for question_id, inc in increments.items()
+    ], ordered=False)
+    return sum(inc['shown'] for inc in increments.values()), len(increments)
+
+async def claim_question_stats_run() -> bool:
+    """Take the pipeline lease; False while another live run holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.pipeline_state.find_one_and_update(
+            {
+                '_id': QUESTION_STATS_STATE_ID,
+                '$or': [{'lease_until': None}, {'lease_until': {'$lt': now.isoformat()}}]
+            },
+            {'$set': {
+                'lease_owner': WORKER_ID,
+                'lease_until': (now + timedelta(seconds=QUESTION_STATS_LEASE_SECONDS)).isoformat()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False  # Document exists but its lease is live
+    return True
+
+async def refresh_question_stats(
+    batch_size: int = QUESTION_STATS_BATCH_SIZE,
+    max_batches: Optional[int] = None
+) -> dict:
+    """Fold attempts completed since the last watermark into question_stats"""
+    started = time.monotonic()
+    if not await claim_question_stats_run():
+        raise HTTPException(status_code=409, detail='Question stats refresh already running')
+    state = await db.pipeline_state.find_one({'_id': QUESTION_STATS_STATE_ID}) or {}
+    watermark = state.get('watermark', '')
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=QUESTION_STATS_LAG_SECONDS)).isoformat()
+    report = {'attempts': 0, 'answers': 0, 'questions_updated': 0, 'batches': 0, 'watermark': watermark or None}
+    
+    try:
+        await fold_question_stats(report, watermark, cutoff, batch_size, max_batches)
+    finally:
+        await db.pipeline_state.update_one(
+            {'_id': QUESTION_STATS_STATE_ID, 'lease_owner': WORKER_ID},
+            {'$set': {'lease_until': None}}
+        )
+    
+    elapsed = time.monotonic() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['attempts_per_second'] = round(report['attempts'] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+async def fold_question_stats(report: dict, watermark: str, cutoff: str, batch_size: int, max_batches: Optional[int]):
+    while max_batches is None or report['batches'] < max_batches:
+        query = {'status': 'completed', 'end_time': {'$lt': cutoff}}
+        if watermark:
+            end_time, attempt_id = watermark.split('|', 1)
+            query['$or'] = [{'end_time': {'$gt': end_time}}, {'end_time': end_time, 'id': {'$gt': attempt_id}}]
+        attempts = await db.attempts.find(query, QUESTION_STATS_ATTEMPT_PROJECTION).sort(
+            [('end_time', 1), ('id', 1)]
+        ).limit(batch_size).to_list(batch_size)
+        if not attempts:
+            break
+        
+        answers, questions = await apply_question_stats_batch(attempts)
+        watermark = attempt_stats_key(attempts[-1])
+        await db.pipeline_state.update_one(
+            {'_id': QUESTION_STATS_STATE_ID},
+            {'$set': {
+                'watermark': watermark,
+                'lease_until': (datetime.now(timezone.utc) + timedelta(seconds=QUESTION_STATS_LEASE_SECONDS)).isoformat(),
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        report['watermark'] = watermark
+        report['batches'] += 1
+        report['attempts'] += len(attempts)
+        report['answers'] += answers
+        report['questions_updated'] += questions
+        if len(attempts) < batch_size:
+            break
+
+# (minimum p-value, suggested difficulty), checked in order; anything lower is 'hard'
+P_VALUE_DIFFICULTY_BANDS = [(0.7, 'easy'), (0.4, 'medium')]
+
+def suggested_difficulty(p_value: Optional[float]) -> Optional[str]:
+    if p_value is None:
+        return None
+    for minimum, difficulty in P_VALUE_DIFFICULTY_BANDS:
+        if p_value >= minimum:
+            return difficulty
+    return 'hard'
+
+def item_statistics(question: dict, stats: Optional[dict]) -> dict:
+    """Empirical difficulty and distractor analysis for a question against its current key"""
+    stats = stats or {}
+    shown = stats.get('shown', 0)
+    choices = stats.get('choices', {})
+    score_sums = stats.get('choice_score_sums', {})
+    correct = question.get('correct_answer')
+    p_value = choices.get(correct, 0) / shown if shown else None
+    # Banded unrounded, like the admin listing's query does
+    suggestion = suggested_difficulty(p_value) if shown >= QUESTION_STATS_MIN_SAMPLE else None
+    return {
+        'question_id': question['id'],
+        'exam_id': question.get('exam_id'),
+        'subject': question.get('subject') or question.get('area'),
+        'correct_answer': correct,
+        'difficulty': question.get('difficulty'),
+        'suggested_difficulty': suggestion,
+        'difficulty_mismatch': suggestion is not None and suggestion != question.get('difficulty'),
+        'shown': shown,
+        'blank': stats.get('blank', 0),
+        'p_value': round(p_value, 4) if p_value is not None else None,
+        'options': [
+            {
+                'letter': letter,
+                'count': choices.get(letter, 0),
+                'share': round(choices.get(letter, 0) / shown, 4) if shown else None,
+                # Mean attempt score of students who picked it; a distractor chosen by
+                # strong students (or a key chosen by weak ones) deserves a look
+                'mean_score': round(score_sums[letter] / choices[letter], 2) if choices.get(letter) else None,
+                'is_correct': letter == correct
+            }
+            for letter in ANSWER_LETTER_CODES
+        ],
+        'updated_at': stats.get('updated_at')
+    }
+
+QUESTION_STATS_QUESTION_PROJECTION = {'_id': 0, 'id': 1, 'exam_id': 1, 'subject': 1, 'area': 1, 'difficulty': 1, 'correct_answer': 1}
+
+def question_stats_ranking_pipeline(question_query: dict, min_shown: int, mismatched_only: bool, limit: int) -> List[dict]:
+    """Questions joined to their counters, hardest (lowest p-value) first, scored against the current key.
+
+    The p-value and the suggested-difficulty bands are evaluated in the
+    aggregation, so the `limit` rows kept are the hardest of the whole slice.
+    Rows are questions with a `stats` sub-document.
+    """
+    correct_count = {'$switch': {
+        'branches': [
+            {'case': {'$eq': ['$correct_answer', letter]}, 'then': {'$ifNull': [f'$stats.choices.{letter}', 0]}}
+            for letter in ANSWER_LETTER_CODES
+        ],
+        'default': 0
+    }}
+    pipeline = [
+        {'$match': question_query},
+        {'$project': QUESTION_STATS_QUESTION_PROJECTION},
+        {'$lookup': {'from': 'question_stats', 'localField': 'id', 'foreignField': 'question_id', 'as': 'stats'}},
+        {'$unwind': '$stats'},
+        {'$match': {'stats.shown': {'$gte': min_shown}}},
+        {'$addFields': {'p_value': {'$cond': [{'$gt': ['$stats.shown', 0]}, {'$divide': [correct_count, '$stats.shown']}, None]}}},
+    ]
+    if mismatched_only:
+        suggestion = {'$switch': {
+            'branches': [
+                {'case': {'$gte': ['$p_value', minimum]}, 'then': difficulty}
+                for minimum, difficulty in P_VALUE_DIFFICULTY_BANDS
+            ],
+            'default': 'hard'
+        }}
+        pipeline.append({'$match': {'$expr': {'$ne': [suggestion, {'$ifNull': ['$difficulty', None]}]}}})
+    pipeline += [
+        # Questions never shown have no p-value and go last
+        {'$addFields': {'rank': {'$ifNull': ['$p_value', 2]}}},
+        {'$sort': {'rank': 1, 'id': 1}},
+        {'$limit': limit},
+        {'$project': {'rank': 0, 'p_value': 0, 'stats._id': 0}}
+    ]
+    return pipeline
+
+@api_router.post("/admin/question-stats/refresh")
+async def refresh_question_stats_route(
+    request: QuestionStatsRefreshRequest = QuestionStatsRefreshRequest(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Process attempts completed since the last run into question_stats"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    return await refresh_question_stats(batch_size=request.batch_size, max_batches=request.max_batches)
+
+@api_router.get("/admin/question-stats")
+async def list_question_stats(
+    exam_id: Optional[str] = None,
+    subject: Optional[str] = None,
+    mismatched_only: bool = False,
+    min_shown: int = 0,
+    limit: int = 100,
+    current_user: dict = Depends(get_current_user)
+):
+    """Item statistics for a slice of the question bank, least answered-correctly first"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    limit = max(1, min(limit, 500))
+    # Only questions with enough answers get a suggested difficulty to mismatch
+    min_shown = max(min_shown, QUESTION_STATS_MIN_SAMPLE, 1) if mismatched_only else min_shown
+    question_query = {}
+    if exam_id:
+        question_query['exam_id'] = exam_id
+    if subject:
+        question_query['subject'] = subject
+    
+    pipeline = question_stats_ranking_pipeline(question_query, min_shown, mismatched_only, limit)
+    items = [
+        item_statistics(row, row['stats'])
+        async for row in db.questions.aggregate(pipeline, allowDiskUse=True)
+    ]
+    state = await db.pipeline_state.find_one({'_id': QUESTION_STATS_STATE_ID}, {'_id': 0})
+    return {'items': items, 'watermark': (state or {}).get('watermark')}
+
+@api_router.get("/admin/question-stats/{question_id}")
+async def get_question_stats(question_id: str, current_user: dict = Depends(get_current_user)):
+    """Item statistics for one question"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    question = await db.questions.find_one({'id': question_id}, QUESTION_STATS_QUESTION_PROJECTION)
+    if not question:
+        raise HTTPException(status_code=404, detail='Question not found')
+    
+    stats = await db.question_stats.find_one({'question_id': question_id}, {'_id': 0})
+    return item_statistics(question, stats)
+
 # ===== METADATA ROUTES =====
 
 @api_router.get("/metadata/subjects")
@@ -1203,9 +3760,7 @@ async def get_topics(subject: str):
     topics = TOPICS_BY_SUBJECT.get(normalized, [])
     return {"subject": normalized, "topics": topics}
 
-@api_router.get("/metadata/filters")
-async def get_filter_options():
-    """Get available filter options from existing questions"""
+async def compute_filter_options() -> dict:
     # Get unique values from questions collection
     subjects = await db.questions.distinct('subject')
     sources = await db.questions.distinct('source_exam')
@@ -1232,35 +3787,151 @@ async def get_filter_options():
         'valid_subjects': VALID_SUBJECTS
     }
 
+@api_router.get("/metadata/filters")
+async def get_filter_options():
+    """Get available filter options from existing questions (cached until questions change)"""
+    return await metadata_cache.get_or_compute('filters', compute_filter_options)
+
+def split_csv(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+def build_question_filters(
+    subjects: Optional[List[str]] = None,
+    topics: Optional[List[str]] = None,
+    education_level: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    sources: Optional[List[str]] = None,
+    year_range: Optional[List[int]] = None
+) -> Dict[str, dict]:
+    """Map each selected filter dimension (question field) to its match condition"""
+    filters = {}
+    if subjects:
+        filters['subject'] = {'subject': {'$in': [normalize_subject(s) for s in subjects]}}
+    if topics:
+        filters['topic'] = {'topic': {'$in': topics}}
+    if education_level:
+        filters['education_level'] = {'education_level': education_level}
+    if difficulty:
+        filters['difficulty'] = {'difficulty': difficulty}
+    if sources:
+        filters['source_exam'] = {'source_exam': {'$in': sources}}
+    if year_range and len(year_range) == 2:
+        filters['year'] = {'year': {'$gte': year_range[0], '$lte': year_range[1]}}
+    return filters
+
+def combine_filters(filters: Dict[str, dict], exclude: Optional[str] = None) -> dict:
+    conditions = [cond for field, cond in filters.items() if field != exclude]
+    return {'$and': conditions} if conditions else {}
+
+# Facet name -> question field, in response order
+FACET_FIELDS = {
+    'subjects': 'subject',
+    'sources': 'source_exam',
+    'education_levels': 'education_level',
+    'difficulties': 'difficulty',
+    'years': 'year'
+}
+
+async def compute_filter_facets(filters: Dict[str, dict]) -> dict:
+    # Each facet ignores its own filter (so sibling options keep their counts)
+    # but applies every other selected filter; `total` applies them all.
+    facet_stages = {}
+    for name, field in FACET_FIELDS.items():
+        facet_stages[name] = [
+            {'$match': combine_filters(filters, exclude=field)},
+            {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            {'$sort': {'_id': -1 if field == 'year' else 1}}
+        ]
+    facet_stages['total'] = [{'$match': combine_filters(filters)}, {'$count': 'count'}]
+    
+    result = await db.questions.aggregate([{'$facet': facet_stages}]).to_list(1)
+    result = result[0] if result else {}
+    
+    facets = {
+        name: [{'value': row['_id'], 'count': row['count']} for row in result.get(name, []) if row['_id'] not in (None, '')]
+        for name in FACET_FIELDS
+    }
+    total = result.get('total') or [{'count': 0}]
+    return {'facets': facets, 'total': total[0]['count']}
+
+@api_router.get("/metadata/facets")
+async def get_filter_facets(
+    subjects: Optional[str] = None,
+    topics: Optional[str] = None,
+    education_level: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    sources: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None
+):
+    """Filter options with per-value counts, conditioned on the selected filters.
+
+    One $facet aggregation returns counts for every subject, source, level,
+    difficulty and year plus the number of questions matching all filters
+    (`total`), so the builder UI needs a single call per filter change.
+    """
+    year_range = None
+    if year_min is not None or year_max is not None:
+        year_range = [year_min if year_min is not None else 0, year_max if year_max is not None else 9999]
+    filters = build_question_filters(
+        subjects=split_csv(subjects),
+        topics=split_csv(topics),
+        education_level=education_level,
+        difficulty=difficulty,
+        sources=split_csv(sources),
+        year_range=year_range
+    )
+    key = 'facets:' + json.dumps(filters, sort_keys=True, ensure_ascii=False)
+    return await metadata_cache.get_or_compute(key, lambda: compute_filter_facets(filters))
+
 @api_router.get("/metadata/question-count")
 async def get_question_count(
     subjects: Optional[str] = None,
+    topics: Optional[str] = None,
     education_level: Optional[str] = None,
     difficulty: Optional[str] = None,
-    sources: Optional[str] = None
+    sources: Optional[str] = None,
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None
 ):
     """Get count of questions matching filters"""
-    match_conditions = []
-    
-    if subjects:
-        subject_list = [normalize_subject(s.strip()) for s in subjects.split(',')]
-        match_conditions.append({'subject': {'$in': subject_list}})
-    
-    if education_level:
-        match_conditions.append({'education_level': education_level})
-    
-    if difficulty:
-        match_conditions.append({'difficulty': difficulty})
-    
-    if sources:
-        source_list = [s.strip() for s in sources.split(',')]
-        match_conditions.append({'source_exam': {'$in': source_list}})
+    year_range = None
+    if year_min is not None or year_max is not None:
+        year_range = [year_min if year_min is not None else 0, year_max if year_max is not None else 9999]
+    criteria = {
+        'subjects': split_csv(subjects),
+        'topics': split_csv(topics),
+        'education_level': education_level,
+        'difficulty': difficulty,
+        'sources': split_csv(sources),
+        'year_range': year_range
+    }
     
-    query = {'$and': match_conditions} if match_conditions else {}
-    count = await db.questions.count_documents(query)
+    # Served from the in-process bitset index when enabled and built
+    if question_index.ready:
+        return {'count': question_index.count(**criteria)}
     
+    count = await db.questions.count_documents(combine_filters(build_question_filters(**criteria)))
     return {'count': count}
 
+# ===== ADMIN METRICS =====
+
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    """In-process runtime metrics for this worker"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    return {
+        'password_hasher': password_hasher.stats(),
+        'user_cache': user_cache.stats(),
+        'metadata_cache': metadata_cache.stats(),
+        'question_index': question_index.stats(),
+        'answer_key_cache': answer_key_cache.stats(),
+        'answer_buffer': answer_buffer.stats(),
+        'exam_payload_cache': exam_payload_cache.stats()
+    }
+
 # ===== USER ROUTES =====
 
 @api_router.put("/users/subscription")
@@ -1269,48 +3940,280 @@ async def update_subscription(current_user: dict = Depends(get_current_user)):
         {'id': current_user['id']},
         {'$set': {'subscription_status': 'premium'}}
     )
+    user_cache.invalidate(current_user['id'])
     return {'message': 'Subscription updated to premium'}
 
-# ===== STATS ROUTES =====
+# ===== USER STATS =====
+#
+# One `user_stats` document per user backs /stats/dashboard. It is updated
+# incrementally: attempt creation sets `in_progress`, submit bumps the
+# completed counters and per-subject totals, simulation creation bumps
+# `simulations_created`, and regrade applies score deltas. Increments never
+# upsert: a user without a document (created before user_stats existed, or
+# after a reset) gets one rebuilt from their attempts on first use.
+#
+# `user_subject_trends` holds one document per (user, subject, week) with
+# correct/total counters for /stats/trends. Buckets are bumped on submit and
+# adjusted by regrade, and rebuilt together with user_stats.
 
-@api_router.get("/stats/dashboard")
-async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
-    """Get dashboard statistics for user"""
-    user_id = current_user['id']
-    
-    # Get completed attempts
-    completed_attempts = await db.attempts.find(
+ATTEMPT_SUMMARY_FIELDS = ('id', 'exam_id', 'simulation_id', 'exam_title', 'mode', 'start_time', 'end_time', 'duration_seconds')
+
+def attempt_summary(attempt: dict) -> dict:
+    """Dashboard-sized view of an attempt: no answers or per-area breakdown"""
+    summary = {field: attempt.get(field) for field in ATTEMPT_SUMMARY_FIELDS}
+    score = attempt.get('score')
+    if score:
+        summary['score'] = {key: score.get(key) for key in ('total_correct', 'total_questions', 'percentage')}
+    return summary
+
+def stats_key(name: str) -> str:
+    """Subject names as document keys: MongoDB forbids '.' and a leading '$'"""
+    name = name.replace('.', '\uff0e')
+    return '\uff04' + name[1:] if name.startswith('$') else name
+
+def stats_name(key: str) -> str:
+    key = key.replace('\uff0e', '.')
+    return '$' + key[1:] if key.startswith('\uff04') else key
+
+def week_start(timestamp: str) -> str:
+    """Monday (UTC) of the ISO week containing an ISO-8601 timestamp, as YYYY-MM-DD"""
+    day = datetime.fromisoformat(timestamp).astimezone(timezone.utc).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+def trend_updates(
+    attempt: dict,
+    by_subject: Dict[str, dict],
+    sign: int = 1,
+    attempts: int = 1,
+    upsert: bool = True
+) -> List[UpdateOne]:
+    """$inc per subject bucket of the attempt's week (upserting unless told otherwise)"""
+    week = week_start(attempt['end_time'])
+    return [
+        UpdateOne(
+            {'user_id': attempt['user_id'], 'subject': subject, 'week': week},
+            {'$inc': {
+                'correct': sign * totals.get('correct', 0),
+                'total': sign * totals.get('total', 0),
+                'attempts': attempts
+            }},
+            upsert=upsert
+        )
+        for subject, totals in (by_subject or {}).items()
+    ]
+
+def subject_increments(by_subject: Dict[str, dict], sign: int = 1) -> dict:
+    increments = {}
+    for subject, totals in (by_subject or {}).items():
+        key = stats_key(subject)
+        increments[f'by_subject.{key}.correct'] = sign * totals.get('correct', 0)
+        increments[f'by_subject.{key}.total'] = sign * totals.get('total', 0)
+    return increments
+
+async def rebuild_user_stats(user_id: str) -> dict:
+    """Recompute a user's stats document from their attempts and simulations"""
+    stats = {
+        'user_id': user_id,
+        'completed_count': 0,
+        'score_sum': 0.0,
+        'by_subject': {},
+        'last_attempt': None,
+        'in_progress': None,
+        'simulations_created': await db.simulations.count_documents({'created_by': user_id})
+    }
+    trends: Dict[tuple, dict] = {}
+    cursor = db.attempts.find(
         {'user_id': user_id, 'status': 'completed'},
-        {'_id': 0}
-    ).sort('start_time', -1).to_list(100)
+        {'_id': 0, 'answers': 0, 'question_ids': 0, 'answer_seq': 0}
+    ).sort('end_time', 1)
+    async for attempt in cursor:
+        score = attempt.get('score') or {}
+        week = week_start(attempt['end_time']) if attempt.get('end_time') else None
+        for subject, totals in (score.get('by_subject') or {}).items() if week else ():
+            bucket = trends.setdefault((subject, week), {
+                'user_id': user_id, 'subject': subject, 'week': week, 'correct': 0, 'total': 0, 'attempts': 0
+            })
+            bucket['correct'] += totals.get('correct', 0)
+            bucket['total'] += totals.get('total', 0)
+            bucket['attempts'] += 1
+        stats['completed_count'] += 1
+        stats['score_sum'] += score.get('percentage', 0)
+        for subject, totals in (score.get('by_subject') or {}).items():
+            entry = stats['by_subject'].setdefault(stats_key(subject), {'correct': 0, 'total': 0})
+            entry['correct'] += totals.get('correct', 0)
+            entry['total'] += totals.get('total', 0)
+        stats['last_attempt'] = attempt_summary(attempt)
     
-    # Get in-progress attempts
     in_progress = await db.attempts.find_one(
         {'user_id': user_id, 'status': 'in_progress'},
-        {'_id': 0}
+        {'_id': 0, 'answers': 0, 'question_ids': 0, 'answer_seq': 0},
+        sort=[('start_time', -1)]
     )
+    if in_progress:
+        stats['in_progress'] = attempt_summary(in_progress)
+    stats['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    # Calculate stats
-    total_completed = len(completed_attempts)
-    avg_score = 0
-    if total_completed > 0:
-        scores = [a.get('score', {}).get('percentage', 0) for a in completed_attempts]
-        avg_score = round(sum(scores) / len(scores), 1)
+    # Upserts, then a sweep of buckets this rebuild didn't write, so a rebuild
+    # racing another rebuild or a submit's $inc never hits the unique index
+    rebuild_id = str(uuid.uuid4())
+    if trends:
+        await db.user_subject_trends.bulk_write([
+            ReplaceOne(
+                {'user_id': user_id, 'subject': bucket['subject'], 'week': bucket['week']},
+                {**bucket, 'rebuild_id': rebuild_id},
+                upsert=True
+            )
+            for bucket in trends.values()
+        ], ordered=False)
+    await db.user_subject_trends.delete_many({'user_id': user_id, 'rebuild_id': {'$ne': rebuild_id}})
+    await db.user_stats.replace_one({'user_id': user_id}, stats, upsert=True)
+    return stats
+
+async def update_user_stats(user_id: str, update: dict) -> bool:
+    """Apply an incremental update, rebuilding instead when the user has no stats yet.
+
+    Returns False when a rebuild happened, which already reflects the change.
+    """
+    update.setdefault('$set', {})['updated_at'] = datetime.now(timezone.utc).isoformat()
+    result = await db.user_stats.update_one({'user_id': user_id}, update)
+    if result.matched_count == 0:
+        # The rebuild reads the attempt/simulation that triggered this update too
+        await rebuild_user_stats(user_id)
+        return False
+    return True
+
+async def record_stats_safely(update: Awaitable, event: str):
+    """Run a stats update that follows an already committed write.
+
+    Stats can always be rebuilt from attempts, so a failure here is logged
+    instead of failing a request whose write went through.
+    """
+    try:
+        await update
+    except Exception:
+        logger.exception(f"User stats update after {event} failed")
+
+async def record_attempt_started(attempt: dict):
+    await update_user_stats(attempt['user_id'], {'$set': {'in_progress': attempt_summary(attempt)}})
+
+async def record_attempt_completed(attempt: dict):
+    """Fold a just-submitted attempt into its user's stats"""
+    user_id = attempt['user_id']
+    score = attempt['score']
+    applied = await update_user_stats(user_id, {
+        '$inc': {'completed_count': 1, 'score_sum': score['percentage'], **subject_increments(score.get('by_subject'))},
+        '$set': {'last_attempt': attempt_summary(attempt)}
+    })
+    updates = trend_updates(attempt, score.get('by_subject'))
+    if applied and updates:
+        await db.user_subject_trends.bulk_write(updates, ordered=False)
     
-    # Last attempt info
-    last_attempt = completed_attempts[0] if completed_attempts else None
+    # If it was the attempt shown as in progress, show the user's next open one (if any)
+    result = await db.user_stats.update_one(
+        {'user_id': user_id, 'in_progress.id': attempt['id']},
+        {'$set': {'in_progress': None}}
+    )
+    if result.modified_count:
+        other = await db.attempts.find_one(
+            {'user_id': user_id, 'status': 'in_progress'},
+            {'_id': 0, 'answers': 0, 'question_ids': 0, 'answer_seq': 0},
+            sort=[('start_time', -1)]
+        )
+        if other:
+            await db.user_stats.update_one(
+                {'user_id': user_id, 'in_progress': None},
+                {'$set': {'in_progress': attempt_summary(other)}}
+            )
+
+async def record_simulation_created(user_id: str):
+    await update_user_stats(user_id, {'$inc': {'simulations_created': 1}})
+
+def regrade_stats_updates(changed: List[tuple]) -> List[UpdateOne]:
+    """user_stats deltas for attempts whose score changed from attempt['score'] to the new score"""
+    updates = []
+    for attempt, score in changed:
+        old = attempt.get('score') or {}
+        increments = {'score_sum': score['percentage'] - old.get('percentage', 0)}
+        for field, delta in subject_increments(score.get('by_subject')).items():
+            increments[field] = increments.get(field, 0) + delta
+        for field, delta in subject_increments(old.get('by_subject'), sign=-1).items():
+            increments[field] = increments.get(field, 0) + delta
+        updates.append(UpdateOne({'user_id': attempt['user_id']}, {'$inc': increments}))
+        updates.append(UpdateOne(
+            {'user_id': attempt['user_id'], 'last_attempt.id': attempt['id']},
+            {'$set': {'last_attempt.score': attempt_summary({'score': score})['score']}}
+        ))
+    return updates
+
+# ===== STATS ROUTES =====
+
+@api_router.get("/stats/dashboard")
+async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+    """Get dashboard statistics for user"""
+    user_id = current_user['id']
     
-    # Get simulations count
-    simulations_count = await db.simulations.count_documents({'created_by': user_id})
+    # One indexed read; built from the user's attempts the first time
+    stats = await db.user_stats.find_one({'user_id': user_id}, {'_id': 0})
+    if stats is None:
+        stats = await rebuild_user_stats(user_id)
+    
+    total_completed = stats.get('completed_count', 0)
+    avg_score = round(stats.get('score_sum', 0) / total_completed, 1) if total_completed else 0
+    by_subject = {
+        stats_name(key): {
+            'correct': totals['correct'],
+            'total': totals['total'],
+            'percentage': round(totals['correct'] / totals['total'] * 100, 2) if totals['total'] else 0
+        }
+        for key, totals in (stats.get('by_subject') or {}).items()
+    }
     
     return {
         'total_completed': total_completed,
         'average_score': avg_score,
-        'simulations_created': simulations_count,
-        'last_attempt': last_attempt,
-        'in_progress': in_progress
+        'simulations_created': stats.get('simulations_created', 0),
+        'last_attempt': stats.get('last_attempt'),
+        'in_progress': stats.get('in_progress'),
+        'by_subject': by_subject
     }
 
+@api_router.get("/stats/trends")
+async def get_subject_trends(
+    subjects: Optional[str] = None,
+    weeks: int = 12,
+    user_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Weekly accuracy per subject over the last `weeks` weeks (admins may pass user_id)"""
+    if user_id and user_id != current_user['id'] and current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Admin access required')
+    
+    user_id = user_id or current_user['id']
+    # Like the dashboard: users whose attempts predate user_stats get theirs built on first use
+    if not await db.user_stats.find_one({'user_id': user_id}, {'_id': 0, 'user_id': 1}):
+        await rebuild_user_stats(user_id)
+    
+    weeks = max(1, min(weeks, 104))
+    first_week = week_start((datetime.now(timezone.utc) - timedelta(weeks=weeks - 1)).isoformat())
+    query = {'user_id': user_id, 'week': {'$gte': first_week}}
+    subject_list = split_csv(subjects)
+    if subject_list:
+        query['subject'] = {'$in': subject_list}
+    
+    series: Dict[str, list] = {}
+    async for bucket in db.user_subject_trends.find(query, {'_id': 0, 'user_id': 0, 'rebuild_id': 0}).sort('week', 1):
+        if not bucket['total']:
+            continue
+        series.setdefault(bucket['subject'], []).append({
+            'week': bucket['week'],
+            'correct': bucket['correct'],
+            'total': bucket['total'],
+            'attempts': bucket['attempts'],
+            'percentage': round(bucket['correct'] / bucket['total'] * 100, 2)
+        })
+    
+    return {'from_week': first_week, 'weeks': weeks, 'subjects': series}
+
 # Include router
 app.include_router(api_router)
 
@@ -1320,6 +4223,7 @@ app.add_middleware(
     allow_origins=CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 logging.basicConfig(
@@ -1339,6 +4243,7 @@ async def startup_db():
         # Exam indexes
         await db.exams.create_index("id", unique=True)
         await db.exams.create_index([("published", 1), ("year", -1)])
+        await db.exams.create_index([("created_at", -1), ("id", -1)])  # Admin exam listing (keyset)
         
         # Question indexes - OPTIMIZED for scalability
         await db.questions.create_index("id", unique=True)
@@ -1351,12 +4256,13 @@ async def startup_db():
         await db.questions.create_index("difficulty")  # Added for filtering
         await db.questions.create_index([("subject", 1), ("education_level", 1)])
         await db.questions.create_index([("subject", 1), ("difficulty", 1)])  # Common filter combo
-        await db.questions.create_index([("exam_id", 1), ("order", 1)])
+        await db.questions.create_index([("exam_id", 1), ("order", 1), ("id", 1)])  # Exam listings (keyset)
         
         # Simulation indexes
         await db.simulations.create_index("id", unique=True)
         await db.simulations.create_index("created_by")
-        await db.simulations.create_index([("created_by", 1), ("created_at", -1)])  # For listing user's simulations
+        await db.simulations.create_index([("created_by", 1), ("created_at", -1), ("id", -1)])  # For listing user's simulations (keyset)
+        await db.simulations.create_index("question_ids")  # Regrade: simulations containing a question
         
         # Attempt indexes
         await db.attempts.create_index("id", unique=True)
@@ -1364,12 +4270,63 @@ async def startup_db():
         await db.attempts.create_index("exam_id")
         await db.attempts.create_index("simulation_id")
         await db.attempts.create_index([("user_id", 1), ("status", 1)])  # For in-progress queries
-        await db.attempts.create_index([("user_id", 1), ("start_time", -1)])
+        await db.attempts.create_index([("user_id", 1), ("start_time", -1), ("id", -1)])  # Attempt history (keyset)
+        await db.attempts.create_index([("exam_id", 1), ("status", 1)])  # Regrade scans
+        await db.attempts.create_index([("simulation_id", 1), ("status", 1)])
+        
+        # Metadata cache (only used with METADATA_CACHE_PERSIST)
+        await db.metadata_cache.create_index("key", unique=True)
+        
+        # Question deletion log for other workers' filter indexes; a day outlasts any rebuild interval
+        await db.question_deletions.create_index("deleted_at", expireAfterSeconds=86400)
+        
+        # Dashboard stats
+        await db.user_stats.create_index("user_id", unique=True)
+        await db.attempt_reviews.create_index("attempt_id", unique=True)
+        await db.user_subject_trends.create_index([("user_id", 1), ("week", 1), ("subject", 1)], unique=True)
+        
+        # Item statistics (the unique index also makes replayed batches idempotent)
+        await db.question_stats.create_index("question_id", unique=True)
+        await db.attempts.create_index([("status", 1), ("end_time", 1), ("id", 1)])
+        
+        # Import job indexes
+        await db.import_jobs.create_index("id", unique=True)
+        await db.import_jobs.create_index([("status", 1), ("lease_until", 1)])
+        await db.import_job_batches.create_index([("job_id", 1), ("batch", 1)], unique=True)
         
         logger.info("MongoDB indexes created successfully.")
     except Exception as e:
         logger.exception(f"Failed to create MongoDB indexes: {e}")
+    
+    try:
+        backfilled = await backfill_question_counts()
+        if backfilled:
+            logger.info(f"Backfilled question_count on {backfilled} exam(s)")
+    except Exception as e:
+        logger.exception(f"question_count backfill failed; run manage.py reconcile-question-counts: {e}")
+    
+    # Resume imports interrupted by a restart, then keep watching for orphaned jobs
+    spawn_background(import_job_supervisor())
+    
+    if question_index.enabled:
+        spawn_background(question_index_refresher())
+    
+    if answer_buffer.enabled:
+        # Answers acknowledged by a crashed process are written before new ones arrive
+        try:
+            await answer_buffer.recover()
+        except Exception as e:
+            logger.exception(f"Answer journal recovery failed: {e}")
+        spawn_background(answer_buffer_flusher())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(_background_tasks):
+        task.cancel()
+    if answer_buffer.enabled:
+        try:
+            await answer_buffer.flush()
+        except Exception as e:
+            logger.exception(f"Final answer buffer flush failed; answers stay in the journal: {e}")
     client.close()
+    password_hasher.shutdown()
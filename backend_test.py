@@ -5,9 +5,53 @@ import sys
 import json
 from datetime import datetime
 
+JSON_TYPES = {
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'array': list,
+    'object': dict,
+    'null': type(None)
+}
+
+def schema_errors(value, schema, components, path="$"):
+    """Differences between a JSON value and an OpenAPI schema (the subset FastAPI emits).
+
+    Objects must carry exactly the schema's properties, in declaration order,
+    so responses encoded without the Pydantic model are held to its shape.
+    """
+    if '$ref' in schema:
+        return schema_errors(value, components[schema['$ref'].split('/')[-1]], components, path)
+    if 'anyOf' in schema:
+        options = [schema_errors(value, option, components, path) for option in schema['anyOf']]
+        return [] if any(not errors for errors in options) else min(options, key=len)
+
+    expected = schema.get('type')
+    if expected:
+        python_type = JSON_TYPES[expected]
+        if not isinstance(value, python_type) or (expected in ('integer', 'number') and isinstance(value, bool)):
+            return [f"{path}: expected {expected}, got {type(value).__name__}"]
+    if 'enum' in schema and value not in schema['enum']:
+        return [f"{path}: {value!r} not in {schema['enum']}"]
+
+    errors = []
+    if expected == 'array' and 'items' in schema:
+        for i, item in enumerate(value):
+            errors += schema_errors(item, schema['items'], components, f"{path}[{i}]")
+    if expected == 'object' and 'properties' in schema:
+        properties = schema['properties']
+        if list(value) != list(properties):
+            errors.append(f"{path}: keys {list(value)} != schema {list(properties)}")
+        for name, subschema in properties.items():
+            if name in value:
+                errors += schema_errors(value[name], subschema, components, f"{path}.{name}")
+    return errors
+
 class ProvaNoteAPITester:
-    def __init__(self, base_url="http://localhost:8001"):
+    def __init__(self, base_url="http://localhost:8001", fast_json_url=None):
         self.base_url = base_url
+        self.fast_json_url = fast_json_url
         self.api_url = f"{base_url}/api"
         self.student_token = None
         self.admin_token = None
@@ -27,9 +71,9 @@ class ProvaNoteAPITester:
             self.failed_tests.append({"test": name, "details": details})
             print(f"❌ {name} - {details}")
 
-    def make_request(self, method, endpoint, data=None, token=None, expected_status=200):
+    def make_request(self, method, endpoint, data=None, token=None, expected_status=200, api_url=None):
         """Make HTTP request with error handling"""
-        url = f"{self.api_url}/{endpoint}"
+        url = f"{api_url or self.api_url}/{endpoint}"
         headers = {'Content-Type': 'application/json'}
         
         if token:
@@ -250,6 +294,111 @@ class ProvaNoteAPITester:
         else:
             self.log_test("POST /attempts/{id}/submit", False, f"Status: {response.status_code if hasattr(response, 'status_code') else response}")
 
+    def create_contract_exam(self):
+        """Published exam with one question, for the question-list contracts"""
+        success, response = self.make_request('POST', 'admin/exams', {
+            "title": "Contract Test Exam",
+            "year": 2024,
+            "banca": "TEST",
+            "duration_minutes": 30,
+            "instructions": "Contract test",
+            "areas": ["Matemática"]
+        }, token=self.admin_token)
+        if not success:
+            return None
+        exam_id = response.json()['id']
+        self.make_request('POST', 'admin/questions', {
+            "exam_id": exam_id,
+            "statement": "Quanto é 2 + 2? Questão com acentuação e \"aspas\".",
+            "alternatives": [{"letter": letter, "text": text} for letter, text in zip("ABCDE", ["1", "2", "3", "4", "5"])],
+            "correct_answer": "D",
+            "tags": ["contrato"],
+            "difficulty": "easy",
+            "area": "Matemática"
+        }, token=self.admin_token)
+        self.make_request('POST', f'admin/exams/{exam_id}/publish', token=self.admin_token)
+        return exam_id
+
+    def test_response_contracts(self, simulation_id, attempt_id, fast_json_url=None):
+        """Question lists and reviews must match their OpenAPI schemas field for field.
+
+        Guards the FAST_JSON_RESPONSES path, which encodes MongoDB documents
+        without building the response models. With `fast_json_url` (a second
+        server on the same database started with FAST_JSON_RESPONSES=1) every
+        response is also fetched from it and must decode to the same body.
+        """
+        if not simulation_id or not attempt_id or not self.student_token or not self.admin_token:
+            self.log_test("Response Contracts", False, "No simulation/attempt ID or tokens")
+            return
+
+        try:
+            components = requests.get(f"{self.base_url}/openapi.json", timeout=10).json()['components']['schemas']
+        except Exception as e:
+            self.log_test("GET /openapi.json", False, str(e))
+            return
+
+        exam_id = self.create_contract_exam()
+        if not exam_id:
+            self.log_test("Response Contracts", False, "Could not create contract exam")
+            return
+
+        # Completed reviews are snapshotted in the database on submit, so the second
+        # server would only echo the first one's bytes; an open attempt's review is
+        # built by whichever server answers
+        open_attempt_id = None
+        success, response = self.make_request('POST', f'simulations/{simulation_id}/attempt', token=self.student_token)
+        if success:
+            open_attempt_id = response.json()['id']
+            success, response = self.make_request('GET', f'simulations/{simulation_id}', token=self.student_token)
+            if success and response.json().get('question_ids'):
+                self.make_request('POST', f'attempts/{open_attempt_id}/answer', {
+                    "question_id": response.json()['question_ids'][0],
+                    "selected_answer": "A"
+                }, token=self.student_token)
+
+        def list_of(name):
+            return {'type': 'array', 'items': {'$ref': f'#/components/schemas/{name}'}}
+
+        checks = [
+            ("GET /exams/{id}/questions", f'exams/{exam_id}/questions', self.student_token,
+             list_of('QuestionResponseStudent')),
+            ("GET /admin/exams/{id}/questions", f'admin/exams/{exam_id}/questions', self.admin_token,
+             list_of('QuestionResponse')),
+            ("GET /simulations/{id}/questions", f'simulations/{simulation_id}/questions', self.student_token,
+             list_of('QuestionResponseStudent')),
+            ("GET /attempts/{id}/review", f'attempts/{attempt_id}/review', self.student_token,
+             {'$ref': '#/components/schemas/AttemptReviewResponse'}),
+        ]
+        if open_attempt_id:
+            checks.append(("GET /attempts/{id}/review (in progress)", f'attempts/{open_attempt_id}/review',
+                           self.student_token, {'$ref': '#/components/schemas/AttemptReviewResponse'}))
+        fast_api_url = f"{fast_json_url}/api" if fast_json_url else None
+        for name, endpoint, token, schema in checks:
+            success, response = self.make_request('GET', endpoint, token=token)
+            if not success:
+                self.log_test(f"{name} contract", False, f"Status: {response.status_code if hasattr(response, 'status_code') else response}")
+                continue
+            data = response.json()
+            errors = schema_errors(data, schema, components)
+            if not errors and not (data.get('questions') if isinstance(data, dict) else data):
+                errors = ["empty response, nothing was checked"]
+            self.log_test(f"{name} contract", not errors, "; ".join(errors[:5]))
+
+            if fast_api_url:
+                success, fast_response = self.make_request('GET', endpoint, token=token, api_url=fast_api_url)
+                if not success:
+                    self.log_test(f"{name} fast JSON parity", False, f"Status: {fast_response.status_code if hasattr(fast_response, 'status_code') else fast_response}")
+                    continue
+                fast_data = fast_response.json()
+                errors = schema_errors(fast_data, schema, components)
+                if fast_data != data:
+                    errors.append("body differs from the default encoder's")
+                self.log_test(f"{name} fast JSON parity", not errors, "; ".join(errors[:5]))
+
+        if not fast_api_url:
+            print("ℹ️  Fast JSON parity skipped: pass a second server started with FAST_JSON_RESPONSES=1")
+        self.make_request('DELETE', f'admin/exams/{exam_id}', token=self.admin_token)
+
     def test_admin_import_questions(self):
         """Test admin question import with hash detection"""
         if not self.admin_token:
@@ -358,6 +507,7 @@ class ProvaNoteAPITester:
             attempt_id = self.test_simulation_attempt(simulation_id)
             if attempt_id:
                 self.test_attempt_submission(attempt_id)
+                self.test_response_contracts(simulation_id, attempt_id, self.fast_json_url)
 
         # Admin Tests
         print("\n👑 Admin Tests")
@@ -384,7 +534,10 @@ class ProvaNoteAPITester:
         return self.tests_passed == self.tests_run
 
 def main():
-    tester = ProvaNoteAPITester()
+    # Optional: python backend_test.py [base_url] [fast_json_base_url]
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8001"
+    fast_json_url = sys.argv[2] if len(sys.argv) > 2 else None
+    tester = ProvaNoteAPITester(base_url, fast_json_url)
     success = tester.run_all_tests()
     return 0 if success else 1
 
@@ -36,6 +36,22 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Listings page with a cursor: the next page's cursor comes back in the
+// X-Next-Cursor header and is absent on the last page
+export const getNextCursor = (response) => response.headers['x-next-cursor'] || null;
+
+// Follow X-Next-Cursor until the last page; resolves like a single response
+const getAllPages = async (url, params = {}) => {
+  const data = [];
+  let cursor = null;
+  do {
+    const response = await api.get(url, { params: cursor ? { ...params, cursor } : params });
+    data.push(...response.data);
+    cursor = getNextCursor(response);
+  } while (cursor);
+  return { data };
+};
+
 // Auth
 export const register = (data) => api.post('/auth/register', data);
 export const login = (data) => api.post('/auth/login', data);
@@ -50,14 +66,15 @@ export const getExamQuestions = (id) => api.get(`/exams/${id}/questions`);
 export const createAttempt = (data) => api.post('/attempts', data);
 export const getAttempt = (id) => api.get(`/attempts/${id}`);
 export const saveAnswer = (attemptId, data) => api.post(`/attempts/${attemptId}/answer`, data);
+export const saveAnswers = (attemptId, answers) => api.post(`/attempts/${attemptId}/answers`, { answers });
 export const submitAttempt = (id) => api.post(`/attempts/${id}/submit`, {});
-export const getUserAttempts = () => api.get('/attempts');
+export const getUserAttempts = () => getAllPages('/attempts', { limit: 100 });
 
 // ✅ REVIEW (gabarito + detalhes p/ desempenho e revisão)
 export const getAttemptReview = (attemptId) => api.get(`/attempts/${attemptId}/review`);
 
 // Admin - Exams
-export const getAdminExams = () => api.get('/admin/exams');
+export const getAdminExams = () => getAllPages('/admin/exams');
 export const createExam = (data) => api.post('/admin/exams', data);
 export const getAdminExam = (id) => api.get(`/admin/exams/${id}`);
 export const updateExam = (id, data) => api.put(`/admin/exams/${id}`, data);
@@ -66,7 +83,7 @@ export const publishExam = (id) => api.post(`/admin/exams/${id}/publish`);
 export const unpublishExam = (id) => api.post(`/admin/exams/${id}/unpublish`);
 
 // Admin - Questions
-export const getAdminQuestions = (examId) => api.get(`/admin/exams/${examId}/questions`);
+export const getAdminQuestions = (examId) => getAllPages(`/admin/exams/${examId}/questions`);
 export const createQuestion = (data) => api.post('/admin/questions', data);
 export const updateQuestion = (id, data) => api.put(`/admin/questions/${id}`, data);
 export const deleteQuestion = (id) => api.delete(`/admin/questions/${id}`);
@@ -76,7 +93,7 @@ export const importQuestions = (data) => api.post('/admin/import/questions', dat
 
 // Simulations
 export const generateSimulation = (data) => api.post('/simulations/generate', data);
-export const getMySimulations = () => api.get('/simulations/my');
+export const getMySimulations = () => getAllPages('/simulations/my');
 export const getSimulation = (id) => api.get(`/simulations/${id}`);
 export const getSimulationQuestions = (id) => api.get(`/simulations/${id}/questions`);
 export const createSimulationAttempt = (simulationId) => api.post(`/simulations/${simulationId}/attempt`);
@@ -86,9 +103,11 @@ export const getSubjects = () => api.get('/metadata/subjects');
 export const getTopics = (subject) => api.get(`/metadata/topics/${encodeURIComponent(subject)}`);
 export const getFilterOptions = () => api.get('/metadata/filters');
 export const getQuestionCount = (params) => api.get('/metadata/question-count', { params });
+export const getFilterFacets = (params) => api.get('/metadata/facets', { params });
 
 // Stats
 export const getDashboardStats = () => api.get('/stats/dashboard');
+export const getSubjectTrends = (params) => api.get('/stats/trends', { params });
 
 // User
 export const updateSubscription = () => api.put('/users/subscription');
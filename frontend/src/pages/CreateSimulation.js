@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { generateSimulation, getFilterOptions, createSimulationAttempt, getQuestionCount } from '../api';
+import { generateSimulation, getFilterOptions, createSimulationAttempt, getFilterFacets } from '../api';
 import { Header } from '../components/Header';
 import { 
   Sparkles, 
@@ -63,7 +63,7 @@ useEffect(() => {
   countDebounceRef.current = setTimeout(async () => {
     try {
       const params = buildCountParams();
-      const res = await getQuestionCount(params);
+      const res = await getFilterFacets(params);
       const count = Number(res?.data?.count ?? res?.data?.total ?? 0);
       setAvailableCount(Number.isFinite(count) ? count : 0);
     } catch (e) {
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Load test: answer-save latency while a login storm is running.
+
+Measures p50/p99 of POST /api/attempts/{id}/answer on its own (baseline) and
+again while N concurrent logins hammer /api/auth/login. With bcrypt running on
+the password-hashing pool the two p99 numbers should stay close; if bcrypt ran
+on the event loop the second one would jump by ~200ms per queued login.
+
+Usage:
+    python load_test.py [base_url] [concurrent_logins]
+"""
+
+import requests
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STUDENT = {"email": "loadtest@test.com", "password": "loadtest123", "name": "Load Test"}
+ANSWER_SAMPLES = 200
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+class LoginStormLoadTester:
+    def __init__(self, base_url="http://localhost:8001", concurrent_logins=50):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.concurrent_logins = concurrent_logins
+        self.session = requests.Session()
+        self.token = None
+
+    def headers(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def setup(self):
+        """Register (or log in) the load-test student and open a simulation attempt"""
+        response = requests.post(f"{self.api_url}/auth/register", json=STUDENT, timeout=30)
+        if response.status_code != 200:
+            response = requests.post(f"{self.api_url}/auth/login", json={
+                "email": STUDENT["email"],
+                "password": STUDENT["password"]
+            }, timeout=30)
+        response.raise_for_status()
+        self.token = response.json()['token']
+
+        response = requests.post(f"{self.api_url}/simulations/generate", json={"limit": 10},
+                                 headers=self.headers(), timeout=30)
+        response.raise_for_status()
+        simulation = response.json()
+
+        response = requests.post(f"{self.api_url}/simulations/{simulation['id']}/attempt",
+                                 headers=self.headers(), timeout=30)
+        response.raise_for_status()
+        return response.json()['id'], simulation['question_ids']
+
+    def measure_answer_latency(self, attempt_id, question_ids, samples):
+        """Sequential answer saves, returns latencies in milliseconds"""
+        latencies = []
+        for i in range(samples):
+            payload = {"question_id": question_ids[i % len(question_ids)], "selected_answer": "ABCDE"[i % 5]}
+            start = time.perf_counter()
+            response = self.session.post(f"{self.api_url}/attempts/{attempt_id}/answer",
+                                         json=payload, headers=self.headers(), timeout=30)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                print(f"❌ Answer save failed: {response.status_code} {response.text}")
+        return latencies
+
+    def login_storm(self, stop_event):
+        """Keep `concurrent_logins` logins in flight until stop_event is set"""
+        login_count = [0]
+
+        def worker():
+            while not stop_event.is_set():
+                requests.post(f"{self.api_url}/auth/login", json={
+                    "email": STUDENT["email"],
+                    "password": STUDENT["password"]
+                }, timeout=60)
+                login_count[0] += 1
+
+        pool = ThreadPoolExecutor(max_workers=self.concurrent_logins)
+        for _ in range(self.concurrent_logins):
+            pool.submit(worker)
+        return pool, login_count
+
+    def run(self):
+        print("🚀 Answer-save latency under login storm")
+        print(f"Testing against: {self.base_url}")
+        print("=" * 60)
+
+        attempt_id, question_ids = self.setup()
+
+        baseline = self.measure_answer_latency(attempt_id, question_ids, ANSWER_SAMPLES)
+        print(f"Baseline:     p50={percentile(baseline, 50):.1f}ms  p99={percentile(baseline, 99):.1f}ms")
+
+        stop_event = threading.Event()
+        pool, login_count = self.login_storm(stop_event)
+        time.sleep(1)  # let the storm ramp up
+        under_load = self.measure_answer_latency(attempt_id, question_ids, ANSWER_SAMPLES)
+        stop_event.set()
+        pool.shutdown(wait=True)
+        print(f"Login storm:  p50={percentile(under_load, 50):.1f}ms  p99={percentile(under_load, 99):.1f}ms "
+              f"({self.concurrent_logins} concurrent, {login_count[0]} logins)")
+
+        # Flat means within 2x of baseline p99 plus 50ms of noise headroom
+        flat = percentile(under_load, 99) <= percentile(baseline, 99) * 2 + 50
+        print("=" * 60)
+        print("✅ p99 stayed flat" if flat else "❌ p99 degraded under login load")
+        return flat
+
+
+def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8001"
+    concurrent_logins = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    tester = LoginStormLoadTester(base_url, concurrent_logins)
+    return 0 if tester.run() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())